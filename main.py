@@ -1,13 +1,18 @@
 from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from itertools import islice
+from typing import Dict, Iterable, Tuple
 from zoneinfo import ZoneInfo
 from datetime import datetime, timezone
 
 from pipeline.caption_writer import generate_caption
+from services.article_fetcher import iter_with_bodies
 from services.catalog_service import derive_brand_topics, load_brands_from_csv, load_products_from_csv, parse_brand_rss_sources
-from services.rss_ingest import ingest_rss
+from services.llm_cache import report_llm_cache_stats
+from services.rss_ingest import build_feed_registry, ingest_rss, iter_rss_entries
 from services.postly_client import create_post
 from utils.config import SETTINGS
+from utils.llm_client import LLMUnavailableError, llm_available
+from utils.llm_usage import report_llm_usage, set_llm_brand, start_llm_run
 from utils.logger import (
     append_sheet_log,
     article_seen,
@@ -20,11 +25,14 @@ from utils.logger import (
     log_posted_post,
     log_scheduled_post,
     record_article_check,
+    record_feed_yield,
     upsert_brand_topics,
 )
+from utils.models import Entry, Product
 from utils.monitoring import init_sentry
-from pipeline.matcher import select_best_product
-from pipeline.safety_filter import safety_filter
+from pipeline.check_cascade import CascadeState, describe_cascade, report_cascade_stats, run_check_cascade
+from pipeline.matcher import order_entries_by_match
+from pipeline.safety_filter import CLASSIFIER_ERROR, preclassify_hardblock, preclassify_safety
 
 
 def _local_timezone() -> ZoneInfo | None:
@@ -58,6 +66,12 @@ def _schedule_time_for_day(local_dt: datetime) -> datetime:
     )
 
 
+def _brand_sources(brand: Dict) -> list[str]:
+    """Return the brand's RSS override list, or the global default sources."""
+    brand_sources = parse_brand_rss_sources(brand.get("rss_sources", ""))
+    return brand_sources or SETTINGS.rss_sources
+
+
 # Log the current outcome to SQLite/Sheets and continue to next item.
 def _log_and_continue(entry: Dict, product: Dict, caption: str, status: str,
                       reason: str) -> None:
@@ -68,87 +82,83 @@ def _log_and_continue(entry: Dict, product: Dict, caption: str, status: str,
                      SETTINGS.google_sheet_id, payload)
 
 
-# Process a single RSS entry end-to-end (safety, match, caption, post).
-def _process_entry(
-    entry: Dict,
-    products: list,
-    brand: Dict,
-    last_products: list[str],
-    scheduled_time: datetime,
-    now_local: datetime,
-) -> Tuple[bool, str]:
-    """Run safety checks, match a product, generate caption, and post/log result."""
-    print(f"[pipeline] Evaluating entry: {entry.get('title', '')}")
-    entry = {
-        **entry,
-        "brand_name": brand.get("brand_name", ""),
-        "brand_tags": brand.get("tags", ""),
-    }
-    ok, reason = safety_filter(entry, products)
-    if not ok:
-        print(f"[pipeline] Safety filter failed: {reason}")
-        _log_and_continue(entry, {}, "", "skipped", reason)
+# Record the outcome for an entry and every near-duplicate in its cluster.
+def _record_check(brand: Dict, entry: Entry, status: str, reason: str) -> None:
+    """Mark the entry (and its cluster members) as checked in article_history."""
+    for member in [entry, *entry.duplicates]:
         record_article_check(
             SETTINGS.sqlite_path,
             brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            "skipped",
+            member.title,
+            member.history_key(),
+            status,
             reason,
         )
-        return False, reason
 
-    print("[pipeline] Safety filter passed. Selecting product...")
-    product, score = select_best_product(entry, products,
-                                         SETTINGS.product_match_threshold)
-    if not product:
-        print(f"[pipeline] No product match (score={score:.2f}).")
-        _log_and_continue(entry, {}, "", "skipped",
-                          f"No product match (score={score:.2f})")
-        record_article_check(
+
+# Return True if the entry or any member of its cluster was already checked.
+def _entry_seen(brand: Dict, entry: Entry) -> bool:
+    """Check article_history for the entry and its near-duplicates."""
+    return any(
+        article_seen(
             SETTINGS.sqlite_path,
             brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            "skipped",
-            f"No product match (score={score:.2f})",
-        )
-        return False, "No product match"
+            member.title,
+            member.history_key(),
+        ) for member in [entry, *entry.duplicates])
+
+
+# Log and record an entry rejected by a cascade stage.
+def _reject_entry(brand: Dict, state: CascadeState) -> Tuple[bool, str]:
+    """Persist the rejection; classifier errors are logged but not recorded as checked."""
+    entry, reason = state.entry, state.reason
+    if reason.startswith(CLASSIFIER_ERROR):
+        # Not a verdict: leave the article unrecorded so the next run checks it again.
+        print(f"[pipeline] Safety classifier returned an invalid response: {reason}")
+        _log_and_continue(entry, {}, "", "failed", reason)
+        return False, reason
+    print(f"[pipeline] Check '{state.stage}' failed: {reason}")
+    _log_and_continue(entry, {}, "", state.status, reason)
+    _record_check(brand, entry, state.status, reason)
+    return False, reason
+
+
+# Process a single RSS entry end-to-end (remaining checks, match, caption, post).
+def _process_entry(
+    state: CascadeState,
+    brand: Dict,
+    last_products: list[str],
+    scheduled_time: datetime,
+    now_local: datetime,
+) -> Tuple[bool, str]:
+    """Run the remaining cascade stages, generate caption, and post/log result."""
+    entry = state.entry
+    print(f"[pipeline] Running LLM checks for entry: {entry.title}")
+    if not run_check_cascade(state):
+        return _reject_entry(brand, state)
+    product, score = state.product, state.score
 
     product_name = product.get("product_name", "")
     if SETTINGS.avoid_repeat_product and last_products and product_name in last_products:
         print("[pipeline] Skipping entry due to repeated product match.")
         return False, "repeat_product"
 
-    print(f"[pipeline] Product matched: {product_name} (score={score:.2f})")
+    print(f"[pipeline] Product matched: {product_name} (score={score:.2f}, "
+          f"similarity={state.similarity:.2f})")
     caption = generate_caption(entry, product)
 
     if not product.get("product_image_url"):
         print("[pipeline] Missing product image URL.")
         _log_and_continue(entry, product, caption, "failed",
                           "Missing product image URL")
-        record_article_check(
-            SETTINGS.sqlite_path,
-            brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            "failed",
-            "Missing product image URL",
-        )
+        _record_check(brand, entry, "failed", "Missing product image URL")
         return False, "Missing product image URL"
 
     if not SETTINGS.postly_api_key:
         print("[pipeline] POSTLY_API_KEY missing; dry run only.")
         _log_and_continue(entry, product, caption, "failed",
                           "Missing POSTLY_API_KEY")
-        record_article_check(
-            SETTINGS.sqlite_path,
-            brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            "failed",
-            "Missing POSTLY_API_KEY",
-        )
+        _record_check(brand, entry, "failed", "Missing POSTLY_API_KEY")
         return False, "Missing POSTLY_API_KEY"
 
     target_platforms = brand.get("target_platforms", "")
@@ -158,27 +168,13 @@ def _process_entry(
         print("[pipeline] Missing target platforms.")
         _log_and_continue(entry, product, caption, "failed",
                           "Missing target platforms")
-        record_article_check(
-            SETTINGS.sqlite_path,
-            brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            "failed",
-            "Missing target platforms",
-        )
+        _record_check(brand, entry, "failed", "Missing target platforms")
         return False, "Missing target platforms"
     if not workspace_ids:
         print("[pipeline] Missing workspace IDs.")
         _log_and_continue(entry, product, caption, "failed",
                           "Missing workspace IDs")
-        record_article_check(
-            SETTINGS.sqlite_path,
-            brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            "failed",
-            "Missing workspace IDs",
-        )
+        _record_check(brand, entry, "failed", "Missing workspace IDs")
         return False, "Missing workspace IDs"
 
     try:
@@ -196,8 +192,8 @@ def _process_entry(
         post_payload = {
             "brand_name": brand.get("brand_name", ""),
             "product_name": product_name,
-            "article_title": entry.get("title", ""),
-            "article_url": entry.get("url", ""),
+            "article_title": entry.title,
+            "article_url": entry.article_url,
             "image_url": product.get("product_image_url", ""),
             "caption": caption,
             "scheduled_time": scheduled_iso,
@@ -210,14 +206,8 @@ def _process_entry(
         else:
             log_scheduled_post(SETTINGS.sqlite_path, post_payload)
         _log_and_continue(entry, product, caption, status, "")
-        record_article_check(
-            SETTINGS.sqlite_path,
-            brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            status,
-            "",
-        )
+        _record_check(brand, entry, status, "")
+        record_feed_yield(SETTINGS.sqlite_path, entry.source)
         return True, status
     except Exception as exc:
         _log_and_continue(entry, product, caption, "failed", str(exc))
@@ -226,8 +216,8 @@ def _process_entry(
             {
                 "brand_name": brand.get("brand_name", ""),
                 "product_name": product_name,
-                "article_title": entry.get("title", ""),
-                "article_url": entry.get("url", ""),
+                "article_title": entry.title,
+                "article_url": entry.article_url,
                 "image_url": product.get("product_image_url", ""),
                 "caption": caption,
                 "scheduled_time": scheduled_time.isoformat(),
@@ -235,44 +225,65 @@ def _process_entry(
                 "status": "failed",
             },
         )
-        record_article_check(
-            SETTINGS.sqlite_path,
-            brand.get("brand_name", ""),
-            entry.get("title", ""),
-            entry.get("url", ""),
-            "failed",
-            str(exc),
-        )
+        _record_check(brand, entry, "failed", str(exc))
         return False, str(exc)
 
 
 def _schedule_for_brand(
     brand: Dict,
     last_products: list[str],
-    products: list,
-    entries: list,
+    products: list[Product],
+    entries: Iterable[Entry],
     scheduled_time: datetime,
     now_local: datetime,
 ) -> bool:
     """Find a valid entry and schedule a post for the brand."""
-    for entry in entries:
-        if article_seen(
-                SETTINGS.sqlite_path,
-                brand.get("brand_name", ""),
-                entry.get("title", ""),
-                entry.get("article_url", ""),
-        ):
-            print("[pipeline] Skipping already-checked article.")
-            continue
-        print("[pipeline] Processing next entry...")
-        posted, reason = _process_entry(entry, products, brand, last_products,
-                                        scheduled_time, now_local)
-        if reason == "repeat_product":
-            continue
-        if posted:
-            print("[pipeline] Post scheduled successfully. Done.")
-            return True
-    return False
+    iterator = iter(entries)
+    while True:
+        window = list(islice(iterator, max(1, SETTINGS.safety_batch_size)))
+        if not window:
+            return False
+        survivors = []
+        for entry in window:
+            if _entry_seen(brand, entry):
+                print("[pipeline] Skipping already-checked article.")
+                continue
+            print(f"[pipeline] Evaluating entry: {entry.title}")
+            entry = entry.evolve(brand_name=brand.get("brand_name", ""),
+                                 brand_tags=brand.get("tags", ""))
+            state = CascadeState(entry, products)
+            if not run_check_cascade(state, local_only=True):
+                _reject_entry(brand, state)
+                continue
+            survivors.append(state)
+        pending = [state for state in survivors if state.pending_llm()]
+        # One batched classifier request covers every entry in the window that reached the LLM.
+        if len(pending) > 1 and SETTINGS.safety_classifier_mode == "combined":
+            verdicts = preclassify_safety([state.entry for state in pending], pending[0].products)
+            for state, verdict in zip(pending, verdicts):
+                state.safety_verdict = verdict
+        elif len(pending) > 1:
+            verdicts = preclassify_hardblock([state.entry for state in pending])
+            for state, verdict in zip(pending, verdicts):
+                state.hardblock_verdict = verdict
+        for state in survivors:
+            if not llm_available():
+                print("[pipeline] LLM service unavailable; stopping evaluation.")
+                return False
+            print("[pipeline] Processing next entry...")
+            try:
+                posted, reason = _process_entry(state, brand, last_products,
+                                                scheduled_time, now_local)
+            except LLMUnavailableError as exc:
+                # Service outage, not a verdict: log it but leave the article unrecorded.
+                print(f"[pipeline] {exc}")
+                _log_and_continue(state.entry, {}, "", "failed", f"LLM unavailable: {exc}")
+                continue
+            if reason == "repeat_product":
+                continue
+            if posted:
+                print("[pipeline] Post scheduled successfully. Done.")
+                return True
 
 
 # Daily pipeline runner: ingest feeds, load catalog, and post first valid item.
@@ -281,15 +292,31 @@ def run_daily() -> None:
     init_sentry(environment="production")
     print("[pipeline] Initializing database...")
     init_db(SETTINGS.sqlite_path)
+    start_llm_run()
     brands = load_brands_from_csv(SETTINGS.brands_csv_path)
     if not brands:
         print("[pipeline] No brands found in Brands.csv.")
         _log_and_continue({}, {}, "", "failed", "Brands.csv is empty")
         return
 
+    print(f"[pipeline] Check cascade: {describe_cascade()}")
+    if SETTINGS.rss_streaming:
+        # Feeds are fetched lazily while the first brand streams its entries;
+        # later brands reuse whatever has been registered by then.
+        feed_registry: Dict[str, Dict] = {}
+    else:
+        print("[pipeline] Fetching RSS feeds for all brands...")
+        feed_registry = build_feed_registry([_brand_sources(brand) for brand in brands])
+        print(f"[pipeline] Unique RSS feeds fetched: {len(feed_registry)}")
+
+    scheduled_posts = 0
     for brand in brands:
         brand_name = brand.get("brand_name", "Unknown")
+        if not llm_available():
+            print("[pipeline] LLM service unavailable; skipping remaining brands.")
+            break
         print(f"[pipeline] Processing brand: {brand_name}")
+        set_llm_brand(brand_name)
         product_csv = brand.get(
             "product_info_csv_path") or SETTINGS.product_info_csv_path
         print(f"[pipeline] Loading product catalog for {brand_name}...")
@@ -305,11 +332,16 @@ def run_daily() -> None:
         topics_payload["updated_at"] = datetime.utcnow().isoformat()
         upsert_brand_topics(SETTINGS.sqlite_path, topics_payload)
 
-        brand_sources = parse_brand_rss_sources(brand.get("rss_sources", ""))
-        sources = brand_sources or SETTINGS.rss_sources
         print(f"[pipeline] Ingesting RSS feeds for {brand_name}...")
-        entries = ingest_rss(sources)
-        print(f"[pipeline] RSS entries loaded: {len(entries)}")
+        if SETTINGS.rss_streaming:
+            entries = iter_rss_entries(_brand_sources(brand), registry=feed_registry)
+            print("[pipeline] Streaming RSS entries as feeds arrive.")
+        else:
+            entries = ingest_rss(_brand_sources(brand), registry=feed_registry)
+            print(f"[pipeline] RSS entries loaded: {len(entries)}")
+            entries = order_entries_by_match(entries, products)
+        if SETTINGS.fetch_article_bodies:
+            entries = iter_with_bodies(entries)
 
         now_local = _local_now()
         today_start, today_end = _day_bounds(now_local)
@@ -346,11 +378,19 @@ def run_daily() -> None:
             scheduled = _schedule_for_brand(brand, last_products, products,
                                             entries, scheduled_time, now_local)
 
-        if not scheduled:
+        if scheduled:
+            scheduled_posts += 1
+        elif not llm_available():
+            print(f"[pipeline] Stopped {brand_name} early: LLM service unavailable.")
+        else:
             print(f"[pipeline] No valid articles found for {brand_name}.")
             _log_and_continue({}, {}, "", "failed",
                               f"No valid articles found for {brand_name}")
 
+    report_cascade_stats()
+    report_llm_cache_stats()
+    report_llm_usage(scheduled_posts)
+
 
 if __name__ == "__main__":
     print(
@@ -1,7 +1,8 @@
 from typing import Dict
 
-from openai import OpenAI
+from services.llm_cache import cached_chat_completion
 from utils.config import SETTINGS
+from utils.models import Entry
 
 # -------------------------
 # Helpers
@@ -12,12 +13,12 @@ def _count_words(text: str) -> int:
     return len(text.split())
 
 
-def _format_source(entry: Dict) -> str:
-    source_url = entry.get("url") or entry.get("source") or "Unknown"
+def _format_source(entry: Entry) -> str:
+    source_url = entry.get("article_url") or entry.get("source") or "Unknown"
     return f"Source: {source_url}"
 
 
-def _build_caption_prompt(entry: Dict, product: Dict) -> str:
+def _build_caption_prompt(entry: Entry, product: Dict) -> str:
     """
     Build a strict but natural prompt for Instagram caption generation.
     """
@@ -55,14 +56,14 @@ STRUCTURE (follow in order, do NOT label sections):
 
 ARTICLE:
 Title: {entry.get("title", "")}
-Summary: {entry.get("summary", "")}
+Summary: {entry.excerpt()}
 Article URL: {entry.get("article_url", "")}
 
 PRODUCT:
 Brand: {entry.get("brand_name", "")}
 Name: {product.get("product_name", "")}
 Description: {product.get("description", "")}
-Key Ingredients: {product.get("key_ingredients", "")}
+Key Ingredients: {product.get("ingredients", "")}
 Product URL: {product.get("product_url", "")}
 
 Write the caption now.
@@ -74,8 +75,9 @@ Write the caption now.
 # -------------------------
 
 
-def generate_caption(entry: Dict, product: Dict) -> str:
+def generate_caption(entry: Entry, product: Dict) -> str:
 
+    entry = Entry.from_dict(entry)
     # ---- Hard guards (fail fast) ----
     assert entry.get("article_url"), "Missing article URL"
     assert product.get("product_url"), "Missing product URL"
@@ -83,22 +85,19 @@ def generate_caption(entry: Dict, product: Dict) -> str:
     Generate an Instagram-ready caption using OpenAI,
     then enforce length and formatting constraints.
     """
-    client = OpenAI(api_key=SETTINGS.novita_api_key,
-                    base_url=SETTINGS.novita_base_url)
-
     prompt = _build_caption_prompt(entry, product)
 
-    response = client.chat.completions.create(
-        model=SETTINGS.novita_model,
-        messages=[{
+    caption = cached_chat_completion(
+        "caption",
+        SETTINGS.novita_model,
+        [{
             "role": "user",
             "content": prompt
         }],
-        temperature=0.6,
+        0.6,
+        validate=bool,
     )
 
-    caption = response.choices[0].message.content.strip()
-
     brand_tag = (entry.get("brand_name") or "").strip()
     product_tag = (product.get("product_name") or "").strip()
     brand_tags_raw = (entry.get("brand_tags") or "").strip()
@@ -0,0 +1,148 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pipeline.matcher import rank_by_keywords, select_best_product
+from pipeline.safety_filter import hard_block_check, safety_filter
+from pipeline.semantic import best_semantic_match
+from utils.config import SETTINGS
+from utils.models import Entry, Product
+
+# Default order: cheapest first; stages that call the LLM come last.
+DEFAULT_CASCADE = (
+    "hardblock_keywords", "keyword_match", "semantic", "image", "ai_safety", "product_select",
+)
+LLM_STAGES = {"ai_safety", "product_select"}
+# Outcome status logged when a stage rejects an entry.
+STAGE_STATUS = {"image": "failed"}
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+@dataclass
+class CascadeState:
+    """Progress of one entry through the check cascade."""
+
+    entry: Entry
+    products: List[Product]
+    ranked: Optional[List[Tuple[Product, float]]] = None
+    product: Optional[Product] = None
+    score: float = 0.0
+    similarity: float = 0.0
+    hardblock_verdict: Optional[Tuple[bool, str]] = None
+    safety_verdict: Optional[Tuple[bool, str]] = None
+    position: int = 0
+    stage: str = ""
+    reason: str = ""
+
+    @property
+    def status(self) -> str:
+        """Outcome status for a rejected entry."""
+        return STAGE_STATUS.get(self.stage, "skipped")
+
+    def pending_llm(self) -> bool:
+        """True when the AI safety stage has not run yet."""
+        return "ai_safety" in cascade_order()[self.position:]
+
+
+def _check_hardblock_keywords(state: CascadeState) -> Tuple[bool, str]:
+    return hard_block_check(state.entry.article_text())
+
+
+def _check_keyword_match(state: CascadeState) -> Tuple[bool, str]:
+    state.ranked = rank_by_keywords(state.entry, state.products)
+    state.score = state.ranked[0][1] if state.ranked else 0.0
+    if state.score < SETTINGS.product_match_threshold:
+        return False, f"No keyword match (score={state.score:.2f})"
+    return True, ""
+
+
+def _check_semantic(state: CascadeState) -> Tuple[bool, str]:
+    if not SETTINGS.use_semantic_filter:
+        return True, ""
+    _product, state.similarity = best_semantic_match(state.entry, state.products)
+    if state.similarity < SETTINGS.semantic_min_similarity:
+        return False, f"No semantic match (similarity={state.similarity:.2f})"
+    return True, ""
+
+
+def _check_image(state: CascadeState) -> Tuple[bool, str]:
+    state.products = [product for product in state.products if product.get("product_image_url")]
+    if not state.products:
+        return False, "Missing product image URL"
+    if state.ranked is not None:
+        state.ranked = [item for item in state.ranked if item[0].get("product_image_url")]
+        state.score = state.ranked[0][1] if state.ranked else 0.0
+        if state.score < SETTINGS.product_match_threshold:
+            return False, f"No keyword match with a product image (score={state.score:.2f})"
+    return True, ""
+
+
+def _check_ai_safety(state: CascadeState) -> Tuple[bool, str]:
+    return safety_filter(state.entry, state.products, state.hardblock_verdict,
+                         state.safety_verdict)
+
+
+def _check_product_select(state: CascadeState) -> Tuple[bool, str]:
+    state.product, state.score = select_best_product(
+        state.entry, state.products, SETTINGS.product_match_threshold, ranked=state.ranked
+    )
+    if not state.product:
+        return False, f"No product match (score={state.score:.2f})"
+    return True, ""
+
+
+STAGES: Dict[str, Callable[[CascadeState], Tuple[bool, str]]] = {
+    "hardblock_keywords": _check_hardblock_keywords,
+    "keyword_match": _check_keyword_match,
+    "semantic": _check_semantic,
+    "image": _check_image,
+    "ai_safety": _check_ai_safety,
+    "product_select": _check_product_select,
+}
+
+
+# Resolve the configured stage order.
+def cascade_order() -> List[str]:
+    """Return CHECK_CASCADE stages; unknown names are dropped and unlisted stages run last."""
+    order = [stage for stage in dict.fromkeys(SETTINGS.check_cascade) if stage in STAGES]
+    return order + [stage for stage in DEFAULT_CASCADE if stage not in order]
+
+
+def describe_cascade() -> str:
+    """Return the stage order, marking stages that call the LLM."""
+    return " -> ".join(
+        f"{stage} (llm)" if stage in LLM_STAGES else stage for stage in cascade_order()
+    )
+
+
+# Run the remaining stages for an entry, optionally stopping at the first LLM stage.
+def run_check_cascade(state: CascadeState, local_only: bool = False) -> bool:
+    """Advance state through the cascade; returns False (with stage/reason set) on rejection."""
+    order = cascade_order()
+    while state.position < len(order):
+        stage = order[state.position]
+        if local_only and stage in LLM_STAGES:
+            return True
+        ok, reason = STAGES[stage](state)
+        state.position += 1
+        with _stats_lock:
+            _stats[(stage, "checked")] += 1
+            if not ok:
+                _stats[(stage, "rejected")] += 1
+        if not ok:
+            state.stage, state.reason = stage, reason
+            return False
+    return True
+
+
+def report_cascade_stats() -> None:
+    """Print how many entries each stage checked and rejected."""
+    with _stats_lock:
+        stats = dict(_stats)
+    for stage in cascade_order():
+        checked = stats.get((stage, "checked"), 0)
+        if checked:
+            print(f"[cascade] {stage}: {checked} checked, {stats.get((stage, 'rejected'), 0)} rejected")
@@ -1,9 +1,17 @@
+import hashlib
+import heapq
+import math
 import re
-from typing import Dict, List, Tuple
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from openai import OpenAI
+import numpy as np
 
+from pipeline.prompt_layout import catalog_digest, catalog_messages, product_summary
+from services.llm_cache import cached_chat_completion
 from utils.config import SETTINGS
+from utils.models import Entry, catalog_cache
 
 NOISE_TOKENS = {
     "health", "healthy", "wellness", "wellbeing", "study", "studies",
@@ -15,7 +23,7 @@ NOISE_TOKENS = {
 
 
 # Tokenize text into keywords for similarity scoring.
-def _tokenize(text: str) -> List[str]:
+def tokenize(text: str) -> List[str]:
     """Extract lowercase tokens for simple keyword matching."""
     tokens = re.findall(r"[a-zA-Z]{3,}", text.lower())
     return [token for token in tokens if token not in NOISE_TOKENS]
@@ -29,95 +37,221 @@ FIELD_WEIGHTS = {
     "description": 1.0,
 }
 
-def _weighted_product_tokens(product: Dict) -> Dict[str, float]:
-    weights: Dict[str, float] = {}
+# BM25 saturation and length-normalization parameters.
+BM25_K1 = 1.2
+BM25_B = 0.75
 
+
+def weighted_term_frequencies(product: Dict) -> Counter:
+    """Return token -> sum of FIELD_WEIGHTS over every occurrence in the product's fields."""
+    terms: Counter = Counter()
     for field, weight in FIELD_WEIGHTS.items():
-        text = product.get(field, "")
-        for token in _tokenize(text):
-            weights[token] = max(weights.get(token, 0), weight)
+        for token in tokenize(product.get(field, "")):
+            terms[token] += weight
+    return terms
+
+
+class CatalogIndex:
+    """Inverted index with field-weighted BM25 postings and IDF, built once per catalog."""
 
-    return weights
+    __slots__ = ("products", "postings", "idf")
 
+    def __init__(self, products: Sequence[Dict]):
+        self.products = list(products)
+        frequencies = [weighted_term_frequencies(product) for product in self.products]
+        lengths = [sum(terms.values()) for terms in frequencies]
+        average_length = (sum(lengths) / len(lengths) if lengths else 0.0) or 1.0
+        # Each posting stores the saturated, length-normalized term weight; scoring only adds idf.
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for position, terms in enumerate(frequencies):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[position] / average_length)
+            for token, frequency in terms.items():
+                weight = frequency * (BM25_K1 + 1) / (frequency + norm)
+                self.postings.setdefault(token, []).append((position, weight))
+        count = len(self.products)
+        self.idf = {
+            token: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self.postings.items()
+        }
 
-# Score how well a product matches a news entry.
-def score_product(entry: Dict, product: Dict) -> float:
-    entry_tokens = set(_tokenize(
-        f"{entry.get('title', '')} {entry.get('summary', '')}"
-    ))
-    if not entry_tokens:
-        return 0.0
+    def search(self, text: str, limit: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """Return (product, score) for products sharing a token with text, best first.
 
-    product_weights = _weighted_product_tokens(product)
-    if not product_weights:
-        return 0.0
+        Only the postings of the article's tokens are visited, so cost follows the number
+        of matching products rather than the catalog size.
+        """
+        entry_tokens = set(tokenize(text))
+        scores: Dict[int, float] = {}
+        for token in entry_tokens:
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for position, weight in self.postings[token]:
+                scores[position] = scores.get(position, 0.0) + idf * weight
+        if not scores:
+            return []
+        # normalize by entry length (softly)
+        norm = len(entry_tokens) ** 0.7
+        key = lambda position: (-scores[position], position)
+        if limit is None:
+            order = sorted(scores, key=key)
+        else:
+            order = heapq.nsmallest(limit, scores, key=key)
+        return [(self.products[position], scores[position] / norm) for position in order]
 
-    score = 0.0
-    for token in entry_tokens:
-        if token in product_weights:
-            score += product_weights[token]
+    def score_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """Return the texts x products score matrix; each cell equals the search() score.
 
-    # normalize by entry length (softly)
-    return score / (len(entry_tokens) ** 0.7)
+        Texts are tokenized once into a sparse (row, token, idf/norm) triple list over the
+        tokens they share with the catalog, then multiplied against the postings matrix.
+        """
+        rows: List[int] = []
+        columns: List[int] = []
+        values: List[float] = []
+        token_columns: Dict[str, int] = {}
+        for row, text in enumerate(texts):
+            entry_tokens = set(tokenize(text))
+            if not entry_tokens:
+                continue
+            norm = len(entry_tokens) ** 0.7
+            for token in entry_tokens:
+                idf = self.idf.get(token)
+                if idf is None:
+                    continue
+                rows.append(row)
+                columns.append(token_columns.setdefault(token, len(token_columns)))
+                values.append(idf / norm)
+        if not values:
+            return np.zeros((len(texts), len(self.products)))
+        entry_matrix = np.zeros((len(texts), len(token_columns)))
+        entry_matrix[rows, columns] = values
+        posting_matrix = np.zeros((len(token_columns), len(self.products)))
+        for token, column in token_columns.items():
+            positions, weights = zip(*self.postings[token])
+            posting_matrix[column, list(positions)] = weights
+        return entry_matrix @ posting_matrix
+
+
+@catalog_cache
+def catalog_index(products: Sequence[Dict]) -> CatalogIndex:
+    """Return the index for a catalog, built once per distinct catalog."""
+    return CatalogIndex(products)
 
 
 # Select the top matching product above the minimum score threshold.
-def _rank_by_keywords(entry: Dict, products: List[Dict]) -> List[Tuple[Dict, float]]:
-    """Return products sorted by keyword overlap score (desc)."""
-    scored: List[Tuple[Dict, float]] = []
-    for product in products:
-        scored.append((product, score_product(entry, product)))
-    return sorted(scored, key=lambda item: item[1], reverse=True)
+def rank_by_keywords(entry: Entry, products: List[Dict],
+                     limit: Optional[int] = None) -> List[Tuple[Dict, float]]:
+    """Return products with a positive BM25 keyword score, sorted by score (desc)."""
+    return catalog_index(products).search(entry.article_text(), limit)
+
+
+# Retrieve the products most related to an article for LLM prompts.
+def retrieve_products(entry: Entry, products: List[Dict], top_k: int) -> List[Dict]:
+    """Return the top_k products by keyword score; the rest of the catalog is left out of the prompt."""
+    if len(products) <= top_k:
+        return list(products)
+    ranked = rank_by_keywords(entry, products, top_k)
+    if not ranked:
+        return list(products[:top_k])
+    return [product for product, _score in ranked]
+
+
+# Order a run's entries by a blend of recency and best keyword match.
+def order_entries_by_match(entries: List[Entry], products: List[Dict]) -> List[Entry]:
+    """Return entries sorted by MATCH_PRIORITY_WEIGHT * match + (1 - weight) * recency (desc).
+
+    match is each entry's best product score relative to the strongest entry; recency halves
+    every RECENCY_HALF_LIFE_HOURS. A weight of 0 keeps the newest-first order.
+    """
+    entries = [Entry.from_dict(entry) for entry in entries]
+    weight = SETTINGS.match_priority_weight
+    if not entries or not products or weight <= 0:
+        return entries
+    best = catalog_index(products).score_matrix([entry.article_text() for entry in entries]).max(axis=1)
+    match = best / best.max() if best.max() > 0 else best
+    now = datetime.utcnow()
+    recency = np.array([
+        0.5 ** (max((now - entry.published).total_seconds(), 0.0) / 3600
+                / SETTINGS.recency_half_life_hours) if entry.published else 0.0
+        for entry in entries
+    ])
+    priority = weight * match + (1 - weight) * recency
+    order = np.argsort(-priority, kind="stable")
+    return [entries[position] for position in order]
 
 
-def _ai_rerank(entry: Dict, candidates: List[Tuple[Dict, float]]) -> Tuple[Dict, float]:
-    """Use NovitaAI to select the best product from the top candidates."""
+RERANK_CHOICE_PATTERN = re.compile(r"choice\s*=\s*(none|\d+)")
+RERANK_MEMO_SIZE = 1024
+
+# (article fingerprint, candidate names) -> chosen product name, or None for NONE.
+_rerank_memo: "OrderedDict[Tuple[str, Tuple[str, ...]], Optional[str]]" = OrderedDict()
+
+
+# Decide whether the keyword ranking is too close to call without the LLM.
+def _rerank_needed(candidates: List[Tuple[Dict, float]]) -> bool:
+    """Return True when the top two keyword scores are within AI_RERANK_SKIP_GAP."""
+    if len(candidates) < 2:
+        return False
+    return candidates[0][1] - candidates[1][1] < SETTINGS.ai_rerank_skip_gap
+
+
+def _ai_rerank(entry: Entry, candidates: List[Tuple[Dict, float]],
+               products: List[Dict]) -> Tuple[Dict, float]:
+    """Use NovitaAI to select the best product from the top candidates of the catalog."""
     if not SETTINGS.novita_api_key:
         return {}, 0.0
 
-    prompt_lines = []
+    names = tuple(product.get("product_name", "") for product, _score in candidates)
+    memo_key = (hashlib.sha1(entry.article_text().encode("utf-8")).hexdigest(), names)
+    if memo_key in _rerank_memo:
+        _rerank_memo.move_to_end(memo_key)
+        choice = _rerank_memo[memo_key]
+        return candidates[names.index(choice)] if choice is not None else ({}, 0.0)
+
+    numbers = catalog_digest(products).numbers
+    candidate_lines = []
     for idx, (product, score) in enumerate(candidates, start=1):
-        prompt_lines.append(
-            f"{idx}) {product.get('product_name', '')} | {product.get('category', '')} | "
-            f"{product.get('main_benefit', '')} | score={score:.2f}"
-        )
-
-    prompt = (
-        "You are selecting the most relevant AP Herb product for a health news article. "
-        "Choose the best option number from the list, or reply NONE if nothing fits. "
-        "Reply with: CHOICE=<number or NONE>\n\n"
-        f"ARTICLE:\n{entry.get('title', '')} {entry.get('summary', '')}\n\n"
-        "CANDIDATES:\n" + "\n".join(prompt_lines)
-    )
+        name = product.get("product_name", "")
+        # Digest products are referenced by id; only those past the digest cap need spelling out.
+        described = f"P{numbers[name]}" if name in numbers else product_summary(product)
+        candidate_lines.append(f"{idx}) {described} | score={score:.2f}")
 
-    client = OpenAI(api_key=SETTINGS.novita_api_key, base_url=SETTINGS.novita_base_url)
-    response = client.chat.completions.create(
-        model=SETTINGS.novita_model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0,
+    instructions = (
+        "You are selecting the most relevant catalog product for the health news article in the "
+        "user message. Choose the best option number from its candidate list, or reply NONE if "
+        "nothing fits. Reply with: CHOICE=<number or NONE>"
     )
-    content = response.choices[0].message.content.strip().lower()
-    if "choice=none" in content:
+
+    content = cached_chat_completion(
+        "rerank",
+        SETTINGS.novita_model,
+        catalog_messages(instructions, entry.article_text(), products,
+                         brand_name=entry.get("brand_name", ""), candidate_lines=candidate_lines),
+        0,
+    ).lower()
+    match = RERANK_CHOICE_PATTERN.search(content)
+    if not match:
         return {}, 0.0
-    if "choice=" in content:
-        try:
-            value = content.split("choice=")[1].split()[0].strip()
-            index = int(value)
-            if 1 <= index <= len(candidates):
-                return candidates[index - 1]
-        except ValueError:
-            return {}, 0.0
-    return {}, 0.0
-
-
-def select_best_product(entry: Dict, products: List[Dict], min_score: float = 0.05) -> Tuple[Dict, float]:
-    """Pick the best product match if it meets the minimum similarity score."""
-    ranked = _rank_by_keywords(entry, products)
+    choice = None
+    if match.group(1) != "none" and 1 <= int(match.group(1)) <= len(candidates):
+        choice = names[int(match.group(1)) - 1]
+    _rerank_memo[memo_key] = choice
+    if len(_rerank_memo) > RERANK_MEMO_SIZE:
+        _rerank_memo.popitem(last=False)
+    return candidates[names.index(choice)] if choice is not None else ({}, 0.0)
+
+
+def select_best_product(entry: Entry, products: List[Dict], min_score: float = 0.05,
+                        ranked: Optional[List[Tuple[Dict, float]]] = None) -> Tuple[Dict, float]:
+    """Pick the best product match if it meets the minimum similarity score (reusing ranked if given)."""
+    entry = Entry.from_dict(entry)
+    if ranked is None:
+        ranked = rank_by_keywords(entry, products)
     if not ranked:
         return {}, 0.0
     top_ranked = [item for item in ranked if item[1] > 0][: SETTINGS.ai_rerank_top_n]
-    if SETTINGS.use_ai_rerank and top_ranked:
-        product, score = _ai_rerank(entry, top_ranked)
+    if SETTINGS.use_ai_rerank and top_ranked and _rerank_needed(top_ranked):
+        product, score = _ai_rerank(entry, top_ranked, products)
         if product and score >= min_score:
             return product, score
         return {}, score
@@ -1,55 +1,70 @@
 from pprint import pprint
 
 from pipeline.caption_writer import generate_caption
-from pipeline.matcher import select_best_product
-from pipeline.safety_filter import safety_filter
+from pipeline.check_cascade import CascadeState, describe_cascade, report_cascade_stats, run_check_cascade
+from services.article_fetcher import iter_with_bodies
 from services.catalog_service import load_brands_from_csv, load_products_from_csv, parse_brand_rss_sources
-from services.rss_ingest import ingest_rss
+from services.llm_cache import report_llm_cache_stats
+from services.rss_ingest import build_feed_registry, ingest_rss
 from utils.config import SETTINGS
+from utils.llm_client import LLMUnavailableError
+from utils.llm_usage import report_llm_usage, start_llm_run
+from utils.logger import init_db
 from utils.monitoring import init_sentry
 
 
 def main() -> None:
     """Preview the next post by printing article, product, caption, and image URL."""
     init_sentry(environment="development")
+    init_db(SETTINGS.sqlite_path)
+    start_llm_run()
     brands = load_brands_from_csv(SETTINGS.brands_csv_path)
     if not brands:
         print("[preview] No brands found in Brands.csv.")
         return
     print(f"[preview] Loaded brands: {len(brands)}")
-    for brand in brands:
+    source_lists = [
+        parse_brand_rss_sources(brand.get("rss_sources", "")) or SETTINGS.rss_sources
+        for brand in brands
+    ]
+    print("[preview] Fetching RSS feeds for all brands...")
+    feed_registry = build_feed_registry(source_lists)
+    for brand, sources in zip(brands, source_lists):
         brand_name = brand.get("brand_name", "Unknown")
         product_csv = brand.get("product_info_csv_path") or SETTINGS.product_info_csv_path
-        brand_sources = parse_brand_rss_sources(brand.get("rss_sources", ""))
-        sources = brand_sources or SETTINGS.rss_sources
         print(f"[preview] Loading RSS entries for {brand_name}...")
-        entries = ingest_rss(sources)
+        entries = ingest_rss(sources, registry=feed_registry)
         print(f"[preview] RSS entries loaded: {len(entries)}")
+        if SETTINGS.fetch_article_bodies:
+            entries = iter_with_bodies(entries)
         print(f"[preview] Loading product catalog for {brand_name}...")
         products = load_products_from_csv(product_csv)
         print(f"[preview] Product match threshold: {SETTINGS.product_match_threshold}")
         print(f"[preview] AI relevance threshold: {SETTINGS.relevance_threshold}")
+        print(f"[preview] Check cascade: {describe_cascade()}")
         for entry in entries:
-            entry = {**entry, "brand_name": brand_name, "brand_tags": brand.get("tags", "")}
+            entry = entry.evolve(brand_name=brand_name, brand_tags=brand.get("tags", ""))
             print(f"[preview] Evaluating entry: {entry.get('title', '')}")
-            ok, reason = safety_filter(entry, products)
-            if not ok:
-                print(f"[preview] Safety filter failed: {reason}")
-                continue
-            print("[preview] Safety filter passed. Selecting product...")
-            product, score = select_best_product(entry, products, SETTINGS.product_match_threshold)
-            if not product:
-                print(f"[preview] No product match (score={score:.2f}).")
-                continue
-            caption = generate_caption(entry, product)
+            state = CascadeState(entry, products)
+            try:
+                if not run_check_cascade(state):
+                    print(f"[preview] Check '{state.stage}' failed: {state.reason}")
+                    continue
+                product, score = state.product, state.score
+                caption = generate_caption(entry, product)
+            except LLMUnavailableError as exc:
+                print(f"[preview] {exc}")
+                return
             print("=== BRAND ===")
             pprint(brand)
             print("=== ARTICLE ===")
-            pprint(entry)
+            pprint(entry.to_dict())
             print("=== PRODUCT ===")
-            pprint(product)
+            pprint(product.to_dict())
             print("=== SCORE ===")
             print(score)
+            print("=== SEMANTIC SIMILARITY ===")
+            print(state.similarity)
             print("=== CAPTION ===")
             print(caption)
             return
@@ -57,4 +72,7 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    report_cascade_stats()
+    report_llm_cache_stats()
+    report_llm_usage(0, persist=False)
\ No newline at end of file
@@ -0,0 +1,127 @@
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from utils.config import SETTINGS
+from utils.models import catalog_cache
+from utils.text_normalizer import TOKEN_PATTERN, fit_token_budget
+
+DIGEST_FIELDS = ("product_name", "category", "main_benefit", "ingredients")
+DIGEST_FIELD_TOKENS = 16
+
+
+@dataclass(frozen=True)
+class CatalogDigest:
+    """Compact numbered listing of a catalog, shared by every prompt for that catalog version."""
+
+    text: str
+    version: str
+    # product_name -> digest number, for products that fit CATALOG_DIGEST_MAX_TOKENS.
+    numbers: Dict[str, int]
+
+
+# One-line product summary for products referenced outside the digest.
+def product_summary(product: Dict) -> str:
+    """Return "name | category | benefit | ingredients | tags" for a product."""
+    summary = " | ".join(
+        [
+            product.get("product_name", ""),
+            product.get("category", ""),
+            product.get("main_benefit", ""),
+            product.get("ingredients", ""),
+            product.get("tags", ""),
+        ]
+    )
+    return summary.strip(" |")
+
+
+@catalog_cache
+def catalog_digest(products: Sequence[Dict]) -> CatalogDigest:
+    """Return the catalog's digest, built once per distinct catalog."""
+    lines: List[str] = []
+    numbers: Dict[str, int] = {}
+    tokens = 0
+    for product in products:
+        name = product.get("product_name", "")
+        if not name or name in numbers:
+            continue
+        fields = [fit_token_budget(" ".join(product.get(field, "").split()), DIGEST_FIELD_TOKENS)
+                  for field in DIGEST_FIELDS]
+        line = f"P{len(numbers) + 1} " + " | ".join(field for field in fields if field)
+        tokens += len(TOKEN_PATTERN.findall(line))
+        if tokens > SETTINGS.catalog_digest_max_tokens:
+            break
+        numbers[name] = len(numbers) + 1
+        lines.append(line)
+    text = "\n".join(lines)
+    version = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+    return CatalogDigest(text, version, numbers)
+
+
+@lru_cache(maxsize=64)
+def _system_prompt(brand_name: str, version: str, digest_text: str, instructions: str) -> str:
+    brand = f" for {brand_name}" if brand_name else ""
+    return (
+        f"PRODUCT CATALOG{brand} (version {version}):\n{digest_text}\n\n"
+        f"TASK:\n{instructions}"
+    )
+
+
+def _candidate_listing(digest: CatalogDigest, candidates: Optional[Sequence[Dict]]) -> str:
+    """Return the "CANDIDATES: P3, P7" block, or "" when every digest product is a candidate."""
+    if candidates is None:
+        return ""
+    names = [product.get("product_name", "") for product in candidates]
+    listed = [f"P{digest.numbers[name]}" for name in names if name in digest.numbers]
+    extra = [f"- {product_summary(product)}" for product, name in zip(candidates, names)
+             if name not in digest.numbers]
+    if not extra and not set(digest.numbers) - set(names):
+        return ""
+    listing = "CANDIDATES: " + (", ".join(listed) or "none from the catalog")
+    if extra:
+        listing += "\n" + "\n".join(extra)
+    return listing
+
+
+# Stable catalog prefix plus a small per-article suffix, so providers can cache the prefix.
+def catalog_messages(instructions: str, text: str, products: Sequence[Dict],
+                     candidates: Optional[Sequence[Dict]] = None, brand_name: str = "",
+                     candidate_lines: Optional[List[str]] = None) -> List[Dict]:
+    """Return [system, user] messages for a catalog-aware classifier.
+
+    The system message (catalog digest, then instructions) depends only on the brand, catalog
+    version, and task. The user message carries the article and, when retrieval narrowed the
+    catalog, the candidates by digest number; candidates missing from a truncated digest are
+    listed in full. ``candidate_lines`` replaces the default candidate listing.
+    """
+    digest = catalog_digest(products)
+    suffix = f"ARTICLE:\n{text}"
+    if candidate_lines is not None:
+        suffix += "\n\nCANDIDATES:\n" + "\n".join(candidate_lines)
+    else:
+        listing = _candidate_listing(digest, candidates)
+        if listing:
+            suffix += f"\n\n{listing}"
+    return [
+        {"role": "system", "content": _system_prompt(brand_name, digest.version, digest.text,
+                                                     instructions)},
+        {"role": "user", "content": suffix},
+    ]
+
+
+# The same catalog prefix with several numbered articles, each with its own candidates.
+def catalog_batch_messages(instructions: str, texts: Sequence[str], products: Sequence[Dict],
+                           candidates: Optional[Sequence[Sequence[Dict]]] = None,
+                           brand_name: str = "") -> List[Dict]:
+    """Return [system, user] messages classifying ``texts`` as articles [1]..[n] in one request."""
+    digest = catalog_digest(products)
+    articles = []
+    for index, text in enumerate(texts):
+        listing = _candidate_listing(digest, candidates[index] if candidates is not None else None)
+        articles.append(f"[{index + 1}]\n{text}" + (f"\n{listing}" if listing else ""))
+    return [
+        {"role": "system", "content": _system_prompt(brand_name, digest.version, digest.text,
+                                                     instructions)},
+        {"role": "user", "content": f"ARTICLES ({len(texts)}):\n" + "\n\n".join(articles)},
+    ]
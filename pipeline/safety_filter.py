@@ -1,7 +1,22 @@
-from typing import Dict, List, Tuple
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
 from utils.config import SETTINGS
-from openai import OpenAI
+from pipeline.matcher import retrieve_products
+from pipeline.prompt_layout import catalog_batch_messages, catalog_messages
+from services.llm_cache import cached_chat_completion
+from utils.llm_client import llm_route
+from utils.models import Entry
+
+BATCH_VERDICT_PATTERN = re.compile(
+    r"^\W*(\d+)\W+(HARDBLOCK\s*=\s*(yes|no)\b.*)$",
+    re.IGNORECASE,
+)
+# Expected keys and types of the combined classifier's JSON reply.
+SAFETY_VERDICT_SCHEMA = {"hardblock": bool, "related": bool, "score": float, "reason": str}
+# Reason prefix for replies that could not be parsed; callers must not treat these as verdicts.
+CLASSIFIER_ERROR = "classifier_error"
 
 
 # Check for hard-blocked topics (returns False if found).
@@ -14,70 +29,124 @@ def hard_block_check(text: str) -> Tuple[bool, str]:
     return True, ""
 
 
-# Placeholder AI safety check .
-def _build_client() -> OpenAI:
-    return OpenAI(api_key=SETTINGS.novita_api_key, base_url=SETTINGS.novita_base_url)
-
-
 def ai_hardblock_check(text: str) -> Tuple[bool, str]:
     """Use NovitaAI to flag hard-block topics in the article."""
     if not SETTINGS.novita_api_key:
         return False, "Missing NOVITA_API_KEY for AI hard-block check"
 
-    prompt = (
+    instructions = (
         "You are a safety classifier. Determine if the article discusses any hard-block topics "
         "(pregnancy, children, cancer, diabetes, mental health, sexual health). "
-        "Reply with a single line in the format: HARDBLOCK=yes|no;REASON=...\n\n"
-        f"ARTICLE:\n{text}"
+        "Reply with a single line in the format: HARDBLOCK=yes|no;REASON=..."
     )
 
-    client = _build_client()
-    response = client.chat.completions.create(
-        model=SETTINGS.novita_model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0,
+    content = cached_chat_completion(
+        "hardblock", SETTINGS.novita_model,
+        [{"role": "system", "content": instructions},
+         {"role": "user", "content": f"ARTICLE:\n{text}"}], 0,
     )
-    content = response.choices[0].message.content.strip()
     if content.lower().startswith("hardblock=yes"):
         return False, content
     return True, ""
 
 
-def ai_product_relevance_check(text: str, products: List[Dict]) -> Tuple[bool, str, float]:
-    """Use NovitaAI to decide if the article relates to any products in the catalog."""
+# Parse "<n>: HARDBLOCK=yes|no;REASON=..." lines into per-article verdicts.
+def _parse_batch_verdicts(content: str, count: int) -> Dict[int, Tuple[bool, str]]:
+    """Return verdicts keyed by 0-based article index; malformed lines are ignored."""
+    verdicts: Dict[int, Tuple[bool, str]] = {}
+    for line in content.splitlines():
+        match = BATCH_VERDICT_PATTERN.match(line.strip())
+        if not match:
+            continue
+        index = int(match.group(1)) - 1
+        if not 0 <= index < count or index in verdicts:
+            continue
+        if match.group(3).lower() == "yes":
+            verdicts[index] = (False, match.group(2))
+        else:
+            verdicts[index] = (True, "")
+    return verdicts
+
+
+def ai_hardblock_check_batch(texts: List[str]) -> List[Tuple[bool, str]]:
+    """Classify several articles for hard-block topics in one NovitaAI request."""
+    if not texts:
+        return []
     if not SETTINGS.novita_api_key:
-        return False, "Missing NOVITA_API_KEY for AI relevance check", 0.0
+        return [(False, "Missing NOVITA_API_KEY for AI hard-block check")] * len(texts)
+    if len(texts) == 1:
+        return [ai_hardblock_check(texts[0])]
+
+    articles = "\n\n".join(f"[{index}]\n{text}" for index, text in enumerate(texts, start=1))
+    instructions = (
+        "You are a safety classifier. For each numbered article, determine if it discusses any "
+        "hard-block topics (pregnancy, children, cancer, diabetes, mental health, sexual health). "
+        "Reply with exactly one line per article, in the format: "
+        "<number>: HARDBLOCK=yes|no;REASON=..."
+    )
+
+    content = cached_chat_completion(
+        "hardblock", SETTINGS.novita_model,
+        [{"role": "system", "content": instructions},
+         {"role": "user", "content": f"ARTICLES ({len(texts)}):\n{articles}"}], 0,
+        validate=lambda reply: len(_parse_batch_verdicts(reply, len(texts))) == len(texts),
+        # One verdict line per article, each within the single-check cap.
+        max_tokens=llm_route("hardblock").max_tokens * len(texts),
+    )
+    verdicts = _parse_batch_verdicts(content, len(texts))
+    missing = [index for index in range(len(texts)) if index not in verdicts]
+    if missing:
+        print(f"[safety] Batch response missing {len(missing)}/{len(texts)} verdicts; "
+              "checking those individually.")
+        for index in missing:
+            verdicts[index] = ai_hardblock_check(texts[index])
+    return [verdicts[index] for index in range(len(texts))]
 
-    product_summaries = []
-    for product in products[:30]:
-        summary = " | ".join(
-            [
-                product.get("product_name", ""),
-                product.get("category", ""),
-                product.get("main_benefit", ""),
-                product.get("ingredients", ""),
-                product.get("tags", ""),
-            ]
-        )
-        product_summaries.append(summary.strip(" |"))
 
-    prompt = (
+# Pre-classify a window of entries with one batched hard-block request.
+def preclassify_hardblock(entries: List[Entry]) -> List[Optional[Tuple[bool, str]]]:
+    """Return one AI hard-block verdict per entry (None where the keyword check already fails)."""
+    entries = [Entry.from_dict(entry) for entry in entries]
+    texts = {}
+    for index, entry in enumerate(entries):
+        combined = entry.article_text()
+        if hard_block_check(combined)[0]:
+            texts[index] = combined
+    verdicts: List[Optional[Tuple[bool, str]]] = [None] * len(entries)
+    if not texts or not SETTINGS.novita_api_key:
+        return verdicts
+    try:
+        results = ai_hardblock_check_batch(list(texts.values()))
+    except Exception as exc:
+        print(f"[safety] Batch hard-block check failed; falling back to per-entry checks: {exc}")
+        return verdicts
+    for index, verdict in zip(texts.keys(), results):
+        verdicts[index] = verdict
+    return verdicts
+
+
+def ai_product_relevance_check(text: str, products: List[Dict],
+                               candidates: Optional[List[Dict]] = None,
+                               brand_name: str = "") -> Tuple[bool, str, float]:
+    """Use NovitaAI to decide if the article relates to any of the candidate products.
+
+    ``products`` is the brand catalog (the cached prompt prefix); ``candidates`` narrows it per article.
+    """
+    if not SETTINGS.novita_api_key:
+        return False, "Missing NOVITA_API_KEY for AI relevance check", 0.0
+
+    instructions = (
         "You are a relevance classifier for a health news Instagram automation. "
-        "Given a news article and a list of products, decide whether the article is "
-        "related to at least one product. Return a relevance score between 0 and 1. "
-        "Reply with a single line in the format: RELATED=yes|no;SCORE=0.00;REASON=...\n\n"
-        f"ARTICLE:\n{text}\n\n"
-        "PRODUCTS:\n- "
-        + "\n- ".join(product_summaries)
+        "Given the news article in the user message, decide whether it is related to at least "
+        "one catalog product (only the listed candidates, when given). "
+        "Return a relevance score between 0 and 1. "
+        "Reply with a single line in the format: RELATED=yes|no;SCORE=0.00;REASON=..."
     )
 
-    client = _build_client()
-    response = client.chat.completions.create(
-        model=SETTINGS.novita_model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0,
+    content = cached_chat_completion(
+        "relevance", SETTINGS.novita_model,
+        catalog_messages(instructions, text, products, candidates, brand_name), 0,
     )
-    content = response.choices[0].message.content.strip()
     lowered = content.lower()
     score = 0.0
     if "score=" in lowered:
@@ -91,17 +160,209 @@ def ai_product_relevance_check(text: str, products: List[Dict]) -> Tuple[bool, s
     return False, content, score
 
 
+# Validate the combined classifier's JSON reply against SAFETY_VERDICT_SCHEMA.
+def parse_safety_verdict(content: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Return (verdict, "") for a valid reply, or (None, error) describing why it is invalid."""
+    start = content.find("{")
+    end = content.rfind("}")
+    if start == -1 or end <= start:
+        return None, "no JSON object in response"
+    try:
+        data = json.loads(content[start:end + 1])
+    except ValueError as exc:
+        return None, f"invalid JSON ({exc})"
+    return _validate_safety_verdict(data)
+
+
+def _validate_safety_verdict(data: Any) -> Tuple[Optional[Dict[str, Any]], str]:
+    if not isinstance(data, dict):
+        return None, "response is not a JSON object"
+    verdict: Dict[str, Any] = {}
+    for key, expected in SAFETY_VERDICT_SCHEMA.items():
+        if key not in data:
+            return None, f"missing field '{key}'"
+        value = data[key]
+        if expected is float:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+                return None, f"field 'score' must be a number between 0 and 1, got {value!r}"
+            value = float(value)
+        elif not isinstance(value, expected):
+            return None, f"field '{key}' must be {expected.__name__}, got {value!r}"
+        verdict[key] = value
+    return verdict, ""
+
+
+# Parse the batched classifier's JSON array into per-article verdicts.
+def _parse_batch_safety_verdicts(content: str, count: int) -> Dict[int, Dict[str, Any]]:
+    """Return valid verdicts keyed by 0-based article index; invalid items are ignored."""
+    start = content.find("[")
+    end = content.rfind("]")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(content[start:end + 1])
+    except ValueError:
+        return {}
+    verdicts: Dict[int, Dict[str, Any]] = {}
+    for item in data if isinstance(data, list) else []:
+        index = item.get("index") if isinstance(item, dict) else None
+        if isinstance(index, bool) or not isinstance(index, int) or not 1 <= index <= count:
+            continue
+        verdict, _error = _validate_safety_verdict(item)
+        if verdict is not None and index - 1 not in verdicts:
+            verdicts[index - 1] = verdict
+    return verdicts
+
+
+def _combined_outcome(verdict: Dict[str, Any]) -> Tuple[bool, str, float]:
+    score = verdict["score"]
+    if verdict["hardblock"]:
+        return False, f"HARDBLOCK=yes;REASON={verdict['reason']}", score
+    if verdict["related"] and score >= SETTINGS.relevance_threshold:
+        return True, "", score
+    related = "yes" if verdict["related"] else "no"
+    return False, f"RELATED={related};SCORE={score:.2f};REASON={verdict['reason']}", score
+
+
+# Hard-block and relevance classification in a single structured-output request.
+def ai_combined_check(text: str, products: List[Dict], candidates: Optional[List[Dict]] = None,
+                      brand_name: str = "") -> Tuple[bool, str, float]:
+    """Return (ok, reason, score); unparseable replies yield a CLASSIFIER_ERROR reason."""
+    if not SETTINGS.novita_api_key:
+        return False, "Missing NOVITA_API_KEY for AI safety check", 0.0
+
+    instructions = (
+        "You are a safety and relevance classifier for a health news Instagram automation. "
+        "First, determine if the article in the user message discusses any hard-block topics "
+        "(pregnancy, children, cancer, diabetes, mental health, sexual health). "
+        "Then decide whether the article is related to at least one catalog product (only the "
+        "listed candidates, when given) and give a relevance score between 0 and 1. "
+        "Reply with only a JSON object of the form "
+        '{"hardblock": true|false, "related": true|false, "score": 0.00, "reason": "..."}, '
+        "with no code fences and a reason of at most a dozen words."
+    )
+    messages = catalog_messages(instructions, text, products, candidates, brand_name)
+
+    verdict, error = None, ""
+    for _attempt in range(2):
+        content = cached_chat_completion(
+            "safety", SETTINGS.novita_model, messages, 0,
+            validate=lambda reply: parse_safety_verdict(reply)[0] is not None,
+        )
+        verdict, error = parse_safety_verdict(content)
+        if verdict is not None:
+            break
+        messages = messages + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": f"That reply was invalid: {error}. "
+                                        "Reply again with only the JSON object."},
+        ]
+    if verdict is None:
+        return False, f"{CLASSIFIER_ERROR}: {error}", 0.0
+    return _combined_outcome(verdict)
+
+
+def ai_combined_check_batch(texts: List[str], products: List[Dict],
+                            candidates: Optional[List[List[Dict]]] = None,
+                            brand_name: str = "") -> List[Tuple[bool, str, float]]:
+    """Run the combined classifier on several articles in one request; returns one result per text."""
+    if not texts:
+        return []
+    if not SETTINGS.novita_api_key:
+        return [(False, "Missing NOVITA_API_KEY for AI safety check", 0.0)] * len(texts)
+    if len(texts) == 1:
+        return [ai_combined_check(texts[0], products, candidates[0] if candidates else None,
+                                  brand_name)]
+
+    instructions = (
+        "You are a safety and relevance classifier for a health news Instagram automation. "
+        "For each numbered article in the user message, first determine if it discusses any "
+        "hard-block topics (pregnancy, children, cancer, diabetes, mental health, sexual health). "
+        "Then decide whether it is related to at least one catalog product (only that article's "
+        "listed candidates, when given) and give a relevance score between 0 and 1. "
+        "Reply with only a JSON array holding one object per article, of the form "
+        '{"index": 1, "hardblock": true|false, "related": true|false, "score": 0.00, '
+        '"reason": "..."}, with no code fences and a reason of at most a dozen words.'
+    )
+
+    content = cached_chat_completion(
+        "safety", SETTINGS.novita_model,
+        catalog_batch_messages(instructions, texts, products, candidates, brand_name), 0,
+        validate=lambda reply: len(_parse_batch_safety_verdicts(reply, len(texts))) == len(texts),
+        # One verdict object per article, each within the single-check cap.
+        max_tokens=llm_route("safety").max_tokens * len(texts),
+    )
+    verdicts = _parse_batch_safety_verdicts(content, len(texts))
+    results = {index: _combined_outcome(verdict) for index, verdict in verdicts.items()}
+    missing = [index for index in range(len(texts)) if index not in results]
+    if missing:
+        print(f"[safety] Batch response missing {len(missing)}/{len(texts)} verdicts; "
+              "checking those individually.")
+        for index in missing:
+            results[index] = ai_combined_check(texts[index], products,
+                                               candidates[index] if candidates else None, brand_name)
+    return [results[index] for index in range(len(texts))]
+
+
+# Pre-classify a window of entries with one batched combined request.
+def preclassify_safety(entries: List[Entry], products: List[Dict]) -> List[Optional[Tuple[bool, str]]]:
+    """Return one combined safety verdict per entry (None where the keyword check already fails)."""
+    entries = [Entry.from_dict(entry) for entry in entries]
+    texts: Dict[int, str] = {}
+    candidates: Dict[int, List[Dict]] = {}
+    for index, entry in enumerate(entries):
+        combined = entry.article_text()
+        if hard_block_check(combined)[0]:
+            texts[index] = combined
+            candidates[index] = retrieve_products(entry, products, SETTINGS.relevance_top_k)
+    verdicts: List[Optional[Tuple[bool, str]]] = [None] * len(entries)
+    if not texts or not SETTINGS.novita_api_key:
+        return verdicts
+    brand_name = entries[next(iter(texts))].get("brand_name", "")
+    try:
+        results = ai_combined_check_batch(list(texts.values()), products,
+                                          list(candidates.values()), brand_name)
+    except Exception as exc:
+        print(f"[safety] Batch safety check failed; falling back to per-entry checks: {exc}")
+        return verdicts
+    for index, (ok, reason, _score) in zip(texts.keys(), results):
+        verdicts[index] = (ok, reason)
+    return verdicts
+
+
 # Run both hard-block and AI safety checks on a single entry.
-def safety_filter(entry: Dict, products: List[Dict]) -> Tuple[bool, str]:
-    """Combine hard-block and AI checks to decide if an entry is safe to post."""
-    combined = f"{entry.get('title', '')} {entry.get('summary', '')}"
+def safety_filter(entry: Entry, products: List[Dict],
+                  hardblock_verdict: Optional[Tuple[bool, str]] = None,
+                  safety_verdict: Optional[Tuple[bool, str]] = None) -> Tuple[bool, str]:
+    """Combine hard-block and AI checks; pre-computed batch verdicts skip the matching AI calls.
+
+    ``hardblock_verdict`` replaces the AI hard-block call in separate mode; ``safety_verdict``
+    replaces the combined classifier call in combined mode.
+    """
+    entry = Entry.from_dict(entry)
+    combined = entry.article_text()
     ok, reason = hard_block_check(combined)
     if not ok:
         return False, reason
-    ok, reason = ai_hardblock_check(combined)
+    if SETTINGS.safety_classifier_mode == "combined" and safety_verdict is not None:
+        return safety_verdict
+    candidates = retrieve_products(entry, products, SETTINGS.relevance_top_k)
+    if len(candidates) < len(products):
+        print(f"[safety] Relevance candidates: top {len(candidates)} of {len(products)} products "
+              "by keyword score.")
+    brand_name = entry.get("brand_name", "")
+    if SETTINGS.safety_classifier_mode == "combined":
+        if hardblock_verdict is not None and not hardblock_verdict[0]:
+            return False, hardblock_verdict[1]
+        ok, reason, _score = ai_combined_check(combined, products, candidates, brand_name)
+        return ok, reason
+    if hardblock_verdict is not None:
+        ok, reason = hardblock_verdict
+    else:
+        ok, reason = ai_hardblock_check(combined)
     if not ok:
         return False, reason
-    ok, reason, _score = ai_product_relevance_check(combined, products)
+    ok, reason, _score = ai_product_relevance_check(combined, products, candidates, brand_name)
     if not ok:
         return False, reason
     return True, ""
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from pipeline.matcher import FIELD_WEIGHTS, tokenize, weighted_term_frequencies
+from utils.config import SETTINGS
+from utils.models import Entry, catalog_cache
+
+
+def _l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+class SemanticIndex:
+    """TF-IDF + truncated SVD (LSA) embedding of a product catalog."""
+
+    __slots__ = ("products", "vocabulary", "idf", "components", "embeddings")
+
+    def __init__(self, products: Sequence[Dict], vocabulary: List[str], idf: np.ndarray,
+                 components: np.ndarray, embeddings: np.ndarray):
+        self.products = list(products)
+        self.vocabulary = {token: column for column, token in enumerate(vocabulary)}
+        self.idf = idf
+        self.components = components
+        self.embeddings = embeddings
+
+    @classmethod
+    def build(cls, products: Sequence[Dict], dimensions: int) -> "SemanticIndex":
+        """Fit TF-IDF weights and a rank-`dimensions` SVD on the catalog."""
+        terms = [weighted_term_frequencies(product) for product in products]
+        vocabulary = sorted({token for counts in terms for token in counts})
+        columns = {token: column for column, token in enumerate(vocabulary)}
+        matrix = np.zeros((len(products), len(vocabulary)))
+        for row, counts in enumerate(terms):
+            for token, weight in counts.items():
+                matrix[row, columns[token]] = weight
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = np.log((1 + len(products)) / (1 + document_frequency)) + 1
+        matrix = _l2_normalize(matrix * idf)
+        if matrix.size:
+            _u, singular, vt = np.linalg.svd(matrix, full_matrices=False)
+            rank = int(np.count_nonzero(singular > 1e-10))
+            components = vt[:min(dimensions, rank)]
+        else:
+            components = np.zeros((0, len(vocabulary)))
+        embeddings = _l2_normalize(matrix @ components.T)
+        return cls(products, vocabulary, idf, components, embeddings)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Project article texts into the catalog's latent space (one row per text)."""
+        matrix = np.zeros((len(texts), len(self.vocabulary)))
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    matrix[row, column] += 1
+        return _l2_normalize(_l2_normalize(matrix * self.idf) @ self.components.T)
+
+    def similarities(self, texts: Sequence[str]) -> np.ndarray:
+        """Cosine similarity of each text against every product (texts x products)."""
+        return self.embed(texts) @ self.embeddings.T
+
+    def rank(self, text: str) -> List[Tuple[Dict, float]]:
+        """Return (product, similarity) for every product, best first."""
+        scores = self.similarities([text])[0]
+        return [(self.products[position], float(scores[position]))
+                for position in np.argsort(-scores, kind="stable")]
+
+
+# Fingerprint the catalog fields and settings that determine the index.
+def _catalog_fingerprint(products: Sequence[Dict], dimensions: int) -> str:
+    """Return a hash of the indexed product fields, FIELD_WEIGHTS, and dimensions."""
+    payload = {
+        "weights": FIELD_WEIGHTS,
+        "dimensions": dimensions,
+        "products": [[product.get(field, "") for field in FIELD_WEIGHTS] for product in products],
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _load_or_build(products: Sequence[Dict]) -> SemanticIndex:
+    """Load the catalog's index from SEMANTIC_INDEX_DIR, building and saving it on a miss."""
+    dimensions = SETTINGS.semantic_dimensions
+    path = os.path.join(SETTINGS.semantic_index_dir,
+                        f"{_catalog_fingerprint(products, dimensions)}.npz")
+    if os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                return SemanticIndex(products, data["vocabulary"].tolist(), data["idf"],
+                                     data["components"], data["embeddings"])
+        except Exception as exc:
+            print(f"[semantic] Ignoring unreadable index {path}: {exc}")
+    index = SemanticIndex.build(products, dimensions)
+    os.makedirs(SETTINGS.semantic_index_dir, exist_ok=True)
+    temp_path = f"{path}.tmp.npz"
+    np.savez(
+        temp_path,
+        vocabulary=np.array(sorted(index.vocabulary, key=index.vocabulary.get), dtype=str),
+        idf=index.idf,
+        components=index.components,
+        embeddings=index.embeddings,
+    )
+    os.replace(temp_path, path)
+    return index
+
+
+@catalog_cache
+def semantic_index(products: Sequence[Dict]) -> SemanticIndex:
+    """Return the catalog's semantic index, cached in memory and on disk."""
+    return _load_or_build(products)
+
+
+# Best semantic match for an article: the cascade pre-filter and secondary score.
+def best_semantic_match(entry: Entry, products: Sequence[Dict]) -> Tuple[Dict, float]:
+    """Return (product, cosine similarity) for the closest product, or ({}, 0.0)."""
+    if not products:
+        return {}, 0.0
+    ranked = semantic_index(products).rank(Entry.from_dict(entry).article_text())
+    return ranked[0]
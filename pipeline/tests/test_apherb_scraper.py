@@ -8,7 +8,7 @@ def main() -> None:
     """Run the AP Herb scraper and print a quick sample of results."""
     products = load_products_from_csv(SETTINGS.product_info_csv_path)
     print(f"Products scraped: {len(products)}")
-    pprint(products[:5])
+    pprint([product.to_dict() for product in products[:5]])
 
 
 if __name__ == "__main__":
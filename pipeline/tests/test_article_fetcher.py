@@ -0,0 +1,92 @@
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services import article_fetcher
+from utils.config import SETTINGS
+from utils.models import Entry
+
+PARAGRAPH = "Ginger and turmeric were studied for joint comfort in a small trial — café résumé naïve."
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Local article server: /ok serves UTF-8 HTML without a charset, /fail returns 500."""
+
+    hits: Counter = Counter()
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        with _StandIn.lock:
+            _StandIn.hits[self.path] += 1
+            _StandIn.active += 1
+            _StandIn.peak = max(_StandIn.peak, _StandIn.active)
+        try:
+            time.sleep(0.05)
+            if self.path.startswith("/fail"):
+                self.send_response(500)
+                self.end_headers()
+                return
+            body = f"<html><body><article><p>{PARAGRAPH}</p></article></body></html>".encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with _StandIn.lock:
+                _StandIn.active -= 1
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def test_article_fetcher_against_local_server() -> None:
+    """Cache hits skip the network, per-host concurrency is capped, and failures wait out the retry window."""
+    saved = (SETTINGS.article_cache_dir, SETTINGS.article_per_host_limit, SETTINGS.article_max_workers,
+             SETTINGS.article_retry_hours)
+    SETTINGS.article_cache_dir = tempfile.mkdtemp()
+    SETTINGS.article_per_host_limit = 2
+    SETTINGS.article_max_workers = 8
+    SETTINGS.article_retry_hours = 24
+    article_fetcher._host_slots.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        entries = [Entry(title=f"Article {index}", article_url=f"{base}/ok/{index}") for index in range(6)]
+        fetched = article_fetcher.fetch_article_bodies(entries)
+        assert all(entry.body == PARAGRAPH for entry in fetched), fetched[0].body
+        assert _StandIn.peak <= SETTINGS.article_per_host_limit, _StandIn.peak
+
+        # Cache hit: a second pass never reaches the server.
+        article_fetcher.fetch_article_bodies(entries)
+        assert sum(count for path, count in _StandIn.hits.items() if path.startswith("/ok")) == 6
+
+        # Tracking-parameter variants of one article share a fetch and a cache record.
+        variants = [Entry(title="Variant", article_url=f"{base}/ok/shared?utm_source={source}",
+                          canonical_url=f"{base}/ok/shared") for source in ("rss", "mail")]
+        assert all(entry.body == PARAGRAPH for entry in article_fetcher.fetch_article_bodies(variants))
+        article_fetcher.fetch_article_bodies([variants[1]])
+        assert sum(count for path, count in _StandIn.hits.items() if path.startswith("/ok/shared")) == 1
+
+        # Failures are cached for ARTICLE_RETRY_HOURS, then fetched again.
+        assert article_fetcher.fetch_article_body(f"{base}/fail") == ""
+        assert article_fetcher.fetch_article_body(f"{base}/fail") == ""
+        assert _StandIn.hits["/fail"] == 1
+        SETTINGS.article_retry_hours = 0
+        article_fetcher.fetch_article_body(f"{base}/fail")
+        assert _StandIn.hits["/fail"] == 2
+    finally:
+        server.shutdown()
+        article_fetcher._host_slots.clear()
+        (SETTINGS.article_cache_dir, SETTINGS.article_per_host_limit, SETTINGS.article_max_workers,
+         SETTINGS.article_retry_hours) = saved
+    print(f"[test] Peak concurrent requests per host: {_StandIn.peak}")
+
+
+if __name__ == "__main__":
+    test_article_fetcher_against_local_server()
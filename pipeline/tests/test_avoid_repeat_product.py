@@ -67,7 +67,7 @@ def main() -> None:
     entries = ingest_rss(sources)
     print(f"[test] Searching {len(entries)} RSS entries for eligible product...")
     for index, entry in enumerate(entries, start=1):
-        entry = {**entry, "brand_name": brand_name, "brand_tags": brand.get("tags", "")}
+        entry = entry.evolve(brand_name=brand_name, brand_tags=brand.get("tags", ""))
         print(f"[test] Checking entry {index}/{len(entries)}: {entry.get('title', '')}")
         ok, reason = safety_filter(entry, products)
         if not ok:
@@ -0,0 +1,77 @@
+import json
+import os
+import re
+import tempfile
+from collections import Counter
+from datetime import datetime
+
+import main
+from utils import llm_client
+from utils.config import SETTINGS
+from utils.logger import init_db
+from utils.models import Entry, Product
+
+
+class _Reply:
+    usage = None
+
+    def __init__(self, content: str):
+        self.choices = [type("Choice", (), {"message": type("Message", (), {"content": content})()})()]
+
+
+def test_default_mode_makes_one_call_per_window() -> None:
+    """With SAFETY_CLASSIFIER_MODE=combined, a window of entries costs a single batched combined call."""
+    saved = (SETTINGS.sqlite_path, SETTINGS.novita_api_key, SETTINGS.use_llm_cache,
+             SETTINGS.safety_classifier_mode, SETTINGS.semantic_index_dir)
+    workdir = tempfile.mkdtemp()
+    SETTINGS.sqlite_path = os.path.join(workdir, "logs.sqlite")
+    SETTINGS.semantic_index_dir = os.path.join(workdir, "semantic_index")
+    SETTINGS.novita_api_key = "test"
+    SETTINGS.use_llm_cache = False
+    SETTINGS.safety_classifier_mode = "combined"
+    init_db(SETTINGS.sqlite_path)
+
+    calls: Counter = Counter()
+
+    def create(**request):
+        system = request["messages"][0]["content"]
+        if "JSON" in system:
+            calls["safety"] += 1
+            verdict = {"hardblock": False, "related": False, "score": 0.1, "reason": "off topic"}
+            batch = re.match(r"ARTICLES \((\d+)\)", request["messages"][-1]["content"])
+            if batch:
+                return _Reply(json.dumps([{"index": index, **verdict}
+                                          for index in range(1, int(batch.group(1)) + 1)]))
+            return _Reply(json.dumps(verdict))
+        calls["other"] += 1
+        return _Reply("")
+
+    client = llm_client.get_client()
+    original_create = client.chat.completions.create
+    client.chat.completions.create = create
+    try:
+        products = [
+            Product(product_name="GOUT Rex", category="Joint Health", main_benefit="joint comfort",
+                    ingredients="turmeric ginger", product_image_url="https://example.com/gout.jpg"),
+            Product(product_name="EYE REx", category="Eye Health", main_benefit="visual clarity",
+                    ingredients="lutein astaxanthin", product_image_url="https://example.com/eye.jpg"),
+        ]
+        entries = [
+            Entry(title=f"Turmeric and ginger for joint comfort, part {index}",
+                  article_url=f"https://example.com/joint-{index}",
+                  summary="Researchers looked at turmeric and ginger for joint comfort.")
+            for index in range(3)
+        ]
+        now = datetime.now()
+        main._schedule_for_brand({"brand_name": "Test"}, [], products, entries, now, now)
+    finally:
+        client.chat.completions.create = original_create
+        (SETTINGS.sqlite_path, SETTINGS.novita_api_key, SETTINGS.use_llm_cache,
+         SETTINGS.safety_classifier_mode, SETTINGS.semantic_index_dir) = saved
+
+    print(f"[test] LLM calls: {dict(calls)}")
+    assert calls == Counter({"safety": 1})
+
+
+if __name__ == "__main__":
+    test_default_mode_makes_one_call_per_window()
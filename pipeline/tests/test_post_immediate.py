@@ -44,7 +44,7 @@ def main() -> None:
         return
 
     for index, entry in enumerate(entries, start=1):
-        entry = {**entry, "brand_name": brand_name, "brand_tags": brand.get("tags", "")}
+        entry = entry.evolve(brand_name=brand_name, brand_tags=brand.get("tags", ""))
         print(f"[test] Checking entry {index}/{len(entries)}: {entry.get('title', '')}")
         ok, reason = safety_filter(entry, products)
         if not ok:
@@ -90,7 +90,7 @@ def main() -> None:
                 "brand_name": brand_name,
                 "product_name": product.get("product_name", ""),
                 "article_title": entry.get("title", ""),
-                "article_url": entry.get("url", ""),
+                "article_url": entry.article_url,
                 "image_url": image_url,
                 "caption": caption,
                 "scheduled_time": scheduled_time,
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from services.rss_ingest import FEED_USER_AGENT
+from services.url_canonical import REDIRECT_HOSTS
+from utils.config import SETTINGS
+from utils.models import Entry
+
+ARTICLE_MAX_BYTES = 2 * 1024 * 1024
+CHARSET_PATTERN = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "figure"]
+
+_session: Optional[requests.Session] = None
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+_lock = threading.Lock()
+
+
+# Build one pooled session shared by all article fetches.
+def _get_session() -> requests.Session:
+    """Return a lazily created session whose connection pool matches the worker count."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=SETTINGS.article_max_workers,
+                                  pool_maxsize=SETTINGS.article_max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = FEED_USER_AGENT
+            _session = session
+        return _session
+
+
+# Limit how many requests hit the same host at once.
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    """Return the per-host semaphore for a URL."""
+    host = (urlsplit(url).hostname or "").lower()
+    with _lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(SETTINGS.article_per_host_limit)
+        return _host_slots[host]
+
+
+def _cache_path(key: str) -> str:
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(SETTINGS.article_cache_dir, digest[:2], f"{digest}.json")
+
+
+# Read a cached article body, honoring the retry window for failed fetches.
+def _load_cached(key: str) -> Optional[Dict]:
+    """Return the cached record for key, or None if missing or a stale failure."""
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            record = json.load(handle)
+    except Exception:
+        return None
+    if record.get("status") != "ok":
+        fetched_at = datetime.fromisoformat(record.get("fetched_at", "1970-01-01T00:00:00"))
+        if datetime.utcnow() - fetched_at > timedelta(hours=SETTINGS.article_retry_hours):
+            return None
+    return record
+
+
+def _save_cached(key: str, record: Dict) -> None:
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(record, handle)
+    os.replace(temp_path, path)
+
+
+# Extract readable paragraph text from an article page.
+def extract_article_text(html: Union[str, bytes], encoding: Optional[str] = None) -> str:
+    """Return the main paragraph text of an HTML page, without navigation boilerplate.
+
+    Raw bytes are decoded by BeautifulSoup from ``encoding`` (the HTTP charset, when sent)
+    or the page's own <meta charset>.
+    """
+    if isinstance(html, bytes):
+        soup = BeautifulSoup(html, "html.parser", from_encoding=encoding)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    root = soup.find("article") or soup.find("main") or soup.body or soup
+    paragraphs = [" ".join(p.get_text(" ", strip=True).split()) for p in root.find_all("p")]
+    text = "\n".join(p for p in paragraphs if len(p) >= 40)
+    if not text:
+        text = " ".join(root.get_text(" ", strip=True).split())
+    return text[:SETTINGS.article_body_max_chars]
+
+
+# Download a page with the pooled session under its host's concurrency limit.
+def _download_article(url: str) -> Tuple[bytes, Optional[str]]:
+    """Return the raw page bytes (capped at ARTICLE_MAX_BYTES) and the charset the server declared.
+
+    requests assumes ISO-8859-1 for text/html without a charset, so the bytes are left for
+    BeautifulSoup to decode instead.
+    """
+    with _host_slot(url):
+        with _get_session().get(url, timeout=SETTINGS.article_fetch_timeout, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and "html" not in content_type:
+                raise ValueError(f"Unsupported content type: {content_type}")
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= ARTICLE_MAX_BYTES:
+                    break
+            charset = CHARSET_PATTERN.search(content_type)
+    return b"".join(chunks), charset.group(1) if charset else None
+
+
+# Fetch (or load from cache) the body text for one article URL.
+def fetch_article_body(url: str, cache_key: Optional[str] = None) -> str:
+    """Return extracted body text for url, using the on-disk content cache.
+
+    ``cache_key`` (an entry's canonical key) lets tracking-parameter variants of the same
+    article share one cache record; it defaults to url.
+    """
+    cache_key = cache_key or url
+    if not url.startswith(("http://", "https://")):
+        return ""
+    if (urlsplit(url).hostname or "").lower() in REDIRECT_HOSTS:
+        return ""
+    cached = _load_cached(cache_key)
+    if cached is not None:
+        return cached.get("body", "")
+    started = time.monotonic()
+    record = {"url": url, "fetched_at": datetime.utcnow().isoformat(), "status": "ok", "body": ""}
+    try:
+        record["body"] = extract_article_text(*_download_article(url))
+    except Exception as exc:
+        record["status"] = "error"
+        record["error"] = str(exc)
+        print(f"[article] Body fetch failed ({time.monotonic() - started:.1f}s): {url} - {exc}")
+    _save_cached(cache_key, record)
+    return record["body"]
+
+
+# Attach body text to a batch of entries using the bounded worker pool.
+def fetch_article_bodies(entries: List[Entry]) -> List[Entry]:
+    """Return entries with body filled in (entries that already have one are kept)."""
+    # One fetch per canonical key; the first entry's article_url is the one downloaded.
+    pending: Dict[str, str] = {}
+    for entry in entries:
+        if not entry.body and entry.article_url:
+            pending.setdefault(entry.history_key(), entry.article_url)
+    if not pending:
+        return entries
+    workers = max(1, min(SETTINGS.article_max_workers, len(pending)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        bodies = dict(zip(pending, executor.map(fetch_article_body, pending.values(), pending)))
+    return [
+        entry.evolve(body=bodies[entry.history_key()])
+        if not entry.body and entry.history_key() in bodies else entry
+        for entry in entries
+    ]
+
+
+# Fetch bodies one window at a time so early stops don't pay for the whole feed.
+def iter_with_bodies(entries: Iterable[Entry], window: Optional[int] = None) -> Iterator[Entry]:
+    """Yield entries with bodies attached, fetching each window of entries concurrently."""
+    window = window or SETTINGS.article_fetch_window
+    iterator = iter(entries)
+    while True:
+        batch = list(islice(iterator, window))
+        if not batch:
+            return
+        yield from fetch_article_bodies(batch)
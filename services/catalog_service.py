@@ -7,6 +7,7 @@ import requests
 
 from utils.config import SETTINGS
 from utils.dropbox_auth import get_dropbox_access_token
+from utils.models import Product
 
 
 ROTATION_STATE_PATH = "data/image_rotation.json"
@@ -152,13 +153,13 @@ def _resolve_dropbox_image(folder_path: str) -> Dict[str, str]:
 
 
 # Load product data from CSV and resolve Dropbox image links.
-def load_products_from_csv(csv_path: str, resolve_images: bool = True) -> List[Dict]:
+def load_products_from_csv(csv_path: str, resolve_images: bool = True) -> List[Product]:
     """Read product data from CSV and attach Dropbox image URLs when enabled."""
     if not os.path.exists(csv_path):
         info_path = os.path.join("info", csv_path)
         if os.path.exists(info_path):
             csv_path = info_path
-    products: List[Dict] = []
+    products: List[Product] = []
     with open(csv_path, newline="", encoding="utf-8") as handle:
         reader = csv.DictReader(handle)
         for row in reader:
@@ -166,23 +167,23 @@ def load_products_from_csv(csv_path: str, resolve_images: bool = True) -> List[D
                 continue
             image_path = (row.get("image_path") or "").strip()
             image_result = _resolve_dropbox_image(image_path) if resolve_images else {"image_url": ""}
-            product = {
-                "product_name": row.get("product_name", "").strip(),
-                "product_url": row.get("product_url", "").strip(),
-                "product_image_url": image_result.get("image_url", ""),
-                "image_path": image_path,
-                "image_status": image_result.get("status", "unknown"),
-                "image_name": image_result.get("image_name", ""),
-                "image_rotation_index": image_result.get("rotation_index", ""),
-                "image_rotation_total": image_result.get("rotation_total", ""),
-                "description": row.get("description", "").strip(),
-                "ingredients": row.get("key_ingredients", "").strip(),
-                "main_benefit": row.get("main_benefit", "").strip(),
-                "category": row.get("category", "").strip(),
-                "sub_category": row.get("sub_category", "").strip(),
-                "tags": row.get("tags", "").strip(),
-                "priority": row.get("priority", "").strip(),
-            }
+            product = Product(
+                product_name=row.get("product_name", "").strip(),
+                product_url=row.get("product_url", "").strip(),
+                product_image_url=image_result.get("image_url", ""),
+                image_path=image_path,
+                image_status=image_result.get("status", "unknown"),
+                image_name=image_result.get("image_name", ""),
+                image_rotation_index=image_result.get("rotation_index", ""),
+                image_rotation_total=image_result.get("rotation_total", ""),
+                description=row.get("description", "").strip(),
+                ingredients=row.get("key_ingredients", "").strip(),
+                main_benefit=row.get("main_benefit", "").strip(),
+                category=row.get("category", "").strip(),
+                sub_category=row.get("sub_category", "").strip(),
+                tags=row.get("tags", "").strip(),
+                priority=row.get("priority", "").strip(),
+            )
             products.append(product)
     return products
 
@@ -217,7 +218,7 @@ def _split_csv_list(value: str) -> List[str]:
     return [item.strip() for item in value.split("|") if item.strip()]
 
 
-def derive_brand_topics(products: List[Dict]) -> Dict[str, str]:
+def derive_brand_topics(products: List[Product]) -> Dict[str, str]:
     """Derive topics for a brand based on its product catalog fields."""
     categories = sorted({p.get("category", "").strip() for p in products if p.get("category")})
     subcategories = sorted({p.get("sub_category", "").strip() for p in products if p.get("sub_category")})
@@ -0,0 +1,73 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, List
+
+from utils.models import Entry
+
+
+# Convert Entry records into JSON-safe dicts.
+def _serialize_entries(entries: List[Entry]) -> List[Dict]:
+    """Return entry dicts with datetimes converted to ISO strings."""
+    serialized = []
+    for entry in entries:
+        record = entry.to_dict()
+        record.pop("duplicates", None)
+        if isinstance(record.get("published"), datetime):
+            record["published"] = record["published"].isoformat()
+        serialized.append(record)
+    return serialized
+
+
+# Convert cached dicts back into Entry records.
+def _deserialize_entries(records: List[Dict]) -> List[Entry]:
+    """Return cached entries with ISO strings converted back to datetimes."""
+    entries = []
+    for record in records:
+        entry = dict(record)
+        published = entry.get("published")
+        if published:
+            try:
+                entry["published"] = datetime.fromisoformat(published)
+            except (TypeError, ValueError):
+                entry["published"] = None
+        entries.append(Entry.from_dict(entry))
+    return entries
+
+
+# Load cached feed validators and parsed entries from disk.
+def load_feed_cache(cache_path: str) -> Dict[str, Dict]:
+    """Load the per-source feed cache (etag, last_modified, content_hash, entries)."""
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except Exception:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    cache: Dict[str, Dict] = {}
+    for source, record in data.items():
+        if not isinstance(record, dict):
+            continue
+        cache[source] = {**record, "entries": _deserialize_entries(record.get("entries", []))}
+    return cache
+
+
+# Persist feed validators and parsed entries to disk.
+def save_feed_cache(cache_path: str, cache: Dict[str, Dict]) -> None:
+    """Write the per-source feed cache atomically."""
+    if not cache_path:
+        return
+    directory = os.path.dirname(cache_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {
+        source: {**record, "entries": _serialize_entries(record.get("entries", []))}
+        for source, record in cache.items()
+    }
+    temp_path = f"{cache_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+    os.replace(temp_path, cache_path)
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from utils.config import SETTINGS
+from utils.logger import get_feed_health, log_feed_fetches, upsert_feed_health
+
+
+# Exponential backoff window for a failure/staleness streak.
+def _backoff(streak: int) -> timedelta:
+    """Return base * 2^(streak-1) hours, capped at the configured maximum."""
+    hours = SETTINGS.feed_backoff_base_hours * (2 ** max(streak - 1, 0))
+    return timedelta(hours=min(hours, SETTINGS.feed_backoff_max_hours))
+
+
+# Decide whether a successful fetch brought nothing worth polling for.
+def _is_stale(result: Dict, now: datetime) -> bool:
+    """Return True when the feed was unchanged, empty, or only carries old entries."""
+    if result.get("not_modified") or not result.get("entries"):
+        return True
+    newest = max((entry.published for entry in result["entries"] if entry.published), default=None)
+    return newest is not None and newest < now - timedelta(days=SETTINGS.feed_stale_days)
+
+
+# Split sources into those due for polling and those still backing off.
+def split_due_sources(sources: List[str]) -> Tuple[List[str], List[str]]:
+    """Return (due, skipped) sources based on each feed's next_due_at."""
+    if not SETTINGS.adaptive_feed_polling or not sources:
+        return list(sources), []
+    health = get_feed_health(SETTINGS.sqlite_path, sources)
+    now = datetime.utcnow().isoformat()
+    due: List[str] = []
+    skipped: List[str] = []
+    for source in sources:
+        next_due = (health.get(source) or {}).get("next_due_at")
+        if next_due and next_due > now:
+            skipped.append(source)
+        else:
+            due.append(source)
+    return due, skipped
+
+
+# Persist fetch stats and update each feed's streaks and next due time.
+def record_feed_results(results: List[Dict]) -> None:
+    """Log per-fetch latency/bytes/entries/errors and reschedule failing or stale feeds."""
+    fetched = [result for result in results if result["status"] != "skipped"]
+    if not fetched:
+        return
+    log_feed_fetches(SETTINGS.sqlite_path, fetched)
+    health = get_feed_health(SETTINGS.sqlite_path, [result["source"] for result in fetched])
+    now = datetime.utcnow()
+    now_iso = now.isoformat()
+    rows = []
+    for result in fetched:
+        row = dict(health.get(result["source"]) or {"source": result["source"]})
+        row["last_fetched_at"] = now_iso
+        row["total_fetches"] = (row.get("total_fetches") or 0) + 1
+        row["next_due_at"] = None
+        if result["status"] != "ok":
+            row["consecutive_failures"] = (row.get("consecutive_failures") or 0) + 1
+            row["total_failures"] = (row.get("total_failures") or 0) + 1
+            row["next_due_at"] = (now + _backoff(row["consecutive_failures"])).isoformat()
+        else:
+            row["consecutive_failures"] = 0
+            row["last_success_at"] = now_iso
+            if _is_stale(result, now):
+                row["consecutive_stale"] = (row.get("consecutive_stale") or 0) + 1
+            else:
+                row["consecutive_stale"] = 0
+                row["last_new_content_at"] = now_iso
+            streak = row["consecutive_stale"] - SETTINGS.feed_stale_after + 1
+            if streak > 0:
+                row["next_due_at"] = (now + _backoff(streak)).isoformat()
+        rows.append(row)
+    upsert_feed_health(SETTINGS.sqlite_path, rows)
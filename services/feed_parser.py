@@ -0,0 +1,127 @@
+import io
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+import feedparser
+from dateutil import parser as date_parser
+
+ITEM_TAGS = {"item", "entry"}
+SUMMARY_TAGS = ("description", "summary", "encoded", "content")
+# Only publication dates: feedparser leaves published unset for Atom <updated>.
+DATE_TAGS = ("pubDate", "published", "date")
+
+
+def _local_name(tag: str) -> str:
+    """Strip the XML namespace from an element tag."""
+    return tag.rsplit("}", 1)[-1] if "}" in tag else tag
+
+
+# Parse RFC 822 (RSS) or ISO 8601 (Atom) dates into naive UTC datetimes.
+def _parse_date(value: str) -> Optional[datetime]:
+    """Return a naive UTC datetime, matching feedparser's published_parsed."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    parsed = None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = date_parser.parse(value)
+        except (ValueError, OverflowError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+# Pick the article link from an RSS <link> or Atom <link href> element set.
+def _item_link(item: ET.Element) -> str:
+    """Return the alternate link for an item/entry."""
+    fallback = ""
+    for child in item:
+        if _local_name(child.tag) != "link":
+            continue
+        href = child.get("href")
+        if href is None:
+            if (child.text or "").strip():
+                return child.text.strip()
+            continue
+        if child.get("rel", "alternate") == "alternate":
+            return href.strip()
+        fallback = fallback or href.strip()
+    if not fallback:
+        for child in item:
+            if _local_name(child.tag) == "guid" and child.get("isPermaLink", "true") == "true":
+                return (child.text or "").strip()
+    return fallback
+
+
+# Extract only the fields the pipeline uses from one item/entry element.
+def _item_fields(item: ET.Element) -> Dict:
+    """Return title, link, summary, and published for an RSS item or Atom entry."""
+    texts: Dict[str, str] = {}
+    for child in item:
+        name = _local_name(child.tag)
+        if name not in texts:
+            texts[name] = "".join(child.itertext()).strip()
+    summary = next((texts[name] for name in SUMMARY_TAGS if texts.get(name)), "")
+    published = next((_parse_date(texts[name]) for name in DATE_TAGS if texts.get(name)), None)
+    return {
+        "title": texts.get("title", ""),
+        "link": _item_link(item),
+        "summary": summary,
+        "published": published,
+    }
+
+
+# Incrementally parse RSS/Atom bytes, discarding each item once it is read.
+def parse_feed_fast(content: bytes) -> List[Dict]:
+    """Stream-parse a feed with iterparse; raises ET.ParseError on malformed XML."""
+    entries: List[Dict] = []
+    depth = 0
+    for event, element in ET.iterparse(io.BytesIO(content), events=("start", "end")):
+        if _local_name(element.tag) not in ITEM_TAGS:
+            continue
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            entries.append(_item_fields(element))
+            element.clear()
+    return entries
+
+
+# Convert feedparser output into the same field dictionaries.
+def _feedparser_entries(feed) -> List[Dict]:
+    """Return title, link, summary, and published for each feedparser entry."""
+    entries: List[Dict] = []
+    for entry in feed.entries:
+        published = None
+        if entry.get("published_parsed"):
+            published = datetime(*entry.published_parsed[:6])
+        entries.append({
+            "title": entry.get("title", ""),
+            "link": entry.get("link", ""),
+            "summary": entry.get("summary", ""),
+            "published": published,
+        })
+    return entries
+
+
+# Parse a feed with the configured engine, falling back to feedparser.
+def parse_feed_content(content: bytes, engine: str = "fast") -> Dict:
+    """Return {"entries": [...], "parse_error": str, "engine": str} for raw feed bytes or a path."""
+    if engine == "fast" and isinstance(content, bytes):
+        try:
+            entries = parse_feed_fast(content)
+            if entries:
+                return {"entries": entries, "parse_error": "", "engine": "fast"}
+        except ET.ParseError:
+            pass
+    feed = feedparser.parse(content)
+    parse_error = str(feed.get("bozo_exception", "")) if feed.get("bozo") else ""
+    return {"entries": _feedparser_entries(feed), "parse_error": parse_error, "engine": "feedparser"}
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from utils.config import SETTINGS
+from utils.llm_client import LLMRoute, achat_completion, chat_completion, llm_route
+from utils.logger import get_llm_cache, save_llm_cache
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+# Hash everything that determines a completion.
+def llm_cache_key(model: str, messages: List[Dict], temperature: float, max_tokens: int = 0,
+                  base_url: str = "") -> str:
+    """Return a stable key for (endpoint, model, prompt, temperature, max_tokens)."""
+    prompt_hash = hashlib.sha256(
+        json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    key = f"{base_url}|{model}|{temperature:g}|{prompt_hash}"
+    return f"{key}|{max_tokens}" if max_tokens else key
+
+
+def _count(call_site: str, outcome: str) -> None:
+    with _stats_lock:
+        _stats[(call_site, outcome)] += 1
+
+
+# Hit/miss counters for this process, keyed by call site.
+def llm_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Return {call_site: {"hits": n, "misses": n}}."""
+    with _stats_lock:
+        stats: Dict[str, Dict[str, int]] = {}
+        for (call_site, outcome), count in _stats.items():
+            stats.setdefault(call_site, {"hits": 0, "misses": 0})[outcome] = count
+        return stats
+
+
+def report_llm_cache_stats() -> None:
+    """Print per-call-site cache hits and misses."""
+    for call_site, counts in sorted(llm_cache_stats().items()):
+        print(f"[llm-cache] {call_site}: {counts['hits']} hits, {counts['misses']} misses")
+
+
+def _lookup(call_site: str, key: str) -> Optional[str]:
+    """Return the cached reply for key, or None when it is missing, expired, or unreadable."""
+    try:
+        cached = get_llm_cache(SETTINGS.sqlite_path, key)
+    except sqlite3.Error as exc:
+        print(f"[llm-cache] Lookup failed; calling the model directly: {exc}")
+        cached = None
+    _count(call_site, "hits" if cached is not None else "misses")
+    return cached
+
+
+def _store(call_site: str, key: str, model: str, temperature: float, content: str,
+           ttl_hours: float) -> None:
+    expires_at = datetime.utcnow() + timedelta(hours=ttl_hours)
+    try:
+        save_llm_cache(
+            SETTINGS.sqlite_path,
+            {
+                "cache_key": key,
+                "call_site": call_site,
+                "model": model,
+                "temperature": temperature,
+                "response": content,
+                "expires_at": expires_at.isoformat(),
+            },
+            SETTINGS.llm_cache_max_entries,
+        )
+    except sqlite3.Error as exc:
+        print(f"[llm-cache] Store failed: {exc}")
+
+
+def _ttl_hours(call_site: str) -> float:
+    """Return the call site's TTL, or 0 when caching is disabled for it."""
+    if not SETTINGS.use_llm_cache:
+        return 0
+    return SETTINGS.llm_cache_ttl_hours.get(call_site, 0)
+
+
+@dataclass(frozen=True)
+class _CacheRequest:
+    """A resolved request: its route, token cap, cache key, and any cached reply."""
+
+    route: LLMRoute
+    max_tokens: int
+    ttl_hours: float
+    key: str
+    cached: Optional[str]
+
+
+def _begin(call_site: str, model: str, messages: List[Dict], temperature: float,
+           max_tokens: int) -> _CacheRequest:
+    """Resolve the call site's route and look the request up in the cache."""
+    route = llm_route(call_site, model, temperature)
+    max_tokens = max_tokens or route.max_tokens
+    ttl_hours = _ttl_hours(call_site)
+    key = llm_cache_key(route.model, messages, route.temperature, max_tokens, route.base_url)
+    cached = None
+    if ttl_hours > 0:
+        cached = _lookup(call_site, key)
+    else:
+        _count(call_site, "misses")
+    return _CacheRequest(route, max_tokens, ttl_hours, key, cached)
+
+
+def _finish(call_site: str, request: _CacheRequest, content: str,
+            validate: Optional[Callable[[str], bool]]) -> str:
+    """Store a fresh reply when caching is enabled and it passes ``validate``."""
+    if request.ttl_hours > 0 and (validate is None or validate(content)):
+        _store(call_site, request.key, request.route.model, request.route.temperature, content,
+               request.ttl_hours)
+    return content
+
+
+# Run a chat completion through the persistent response cache.
+def cached_chat_completion(
+    call_site: str,
+    model: str,
+    messages: List[Dict],
+    temperature: float,
+    validate: Optional[Callable[[str], bool]] = None,
+    max_tokens: int = 0,
+) -> str:
+    """Return the reply text, reusing a cached reply for identical requests within the call site's TTL.
+
+    The call site's route (LLM_MODELS, LLM_TEMPERATURES, LLM_MAX_TOKENS, ...) applies;
+    a non-zero ``max_tokens`` overrides its cap. Replies rejected by ``validate`` are returned but not cached.
+    """
+    request = _begin(call_site, model, messages, temperature, max_tokens)
+    if request.cached is not None:
+        return request.cached
+    content = chat_completion(messages, model=request.route.model,
+                              temperature=request.route.temperature, call_site=call_site,
+                              max_tokens=request.max_tokens)
+    return _finish(call_site, request, content, validate)
+
+
+async def acached_chat_completion(
+    call_site: str,
+    model: str,
+    messages: List[Dict],
+    temperature: float,
+    validate: Optional[Callable[[str], bool]] = None,
+    max_tokens: int = 0,
+) -> str:
+    """Async variant of cached_chat_completion using the shared async client."""
+    request = _begin(call_site, model, messages, temperature, max_tokens)
+    if request.cached is not None:
+        return request.cached
+    content = await achat_completion(messages, model=request.route.model,
+                                     temperature=request.route.temperature, call_site=call_site,
+                                     max_tokens=request.max_tokens)
+    return _finish(call_site, request, content, validate)
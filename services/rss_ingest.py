@@ -1,37 +1,326 @@
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import random
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-import feedparser
+import requests
+
+from services.feed_cache import load_feed_cache, save_feed_cache
+from services.feed_health import record_feed_results, split_due_sources
+from services.feed_parser import parse_feed_content
+from services.url_canonical import canonicalize_entries
+from utils.config import SETTINGS
+from utils.models import Entry
+from utils.text_normalizer import normalize_feed_text
+
+FEED_USER_AGENT = "Mozilla/5.0 (compatible; HealthNewsBot/1.0; +https://www.apherb.com)"
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+# MinHash/LSH layout for near-duplicate detection: 16 bands x 4 rows puts the
+# candidate threshold near Jaccard 0.5; candidates are then verified exactly.
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+_MINHASH_PRIME = (1 << 61) - 1
+_MINHASH_RNG = random.Random(20260206)
+_MINHASH_PARAMS = [
+    (_MINHASH_RNG.randrange(1, _MINHASH_PRIME), _MINHASH_RNG.randrange(_MINHASH_PRIME))
+    for _ in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+TITLE_STOPWORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "are", "was", "were", "has",
+    "have", "how", "why", "what", "new", "its", "into", "about", "after", "over", "can",
+    "may", "says", "say", "study", "finds", "shows", "you", "your",
+}
+
+
+# Download a feed body, aborting once the per-source time budget is spent.
+def _download_feed(source: str, timeout: float, cached: Optional[Dict] = None) -> Dict:
+    """Conditionally fetch raw feed bytes; returns status_code, content, etag, last_modified."""
+    deadline = time.monotonic() + timeout
+    headers = {"User-Agent": FEED_USER_AGENT}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    with requests.get(source, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304:
+            return {"status_code": 304, "content": b"", "etag": cached.get("etag", ""),
+                    "last_modified": cached.get("last_modified", "")}
+        response.raise_for_status()
+        chunks = []
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"Feed download exceeded {timeout:.0f}s")
+            chunks.append(chunk)
+        return {
+            "status_code": response.status_code,
+            "content": b"".join(chunks),
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+        }
+
+
+# Convert parsed feed fields into the pipeline's Entry records.
+def _normalize_entries(source: str, parsed_entries: List[Dict]) -> List[Entry]:
+    """Normalize parsed feed entries into Entry records."""
+    entries = []
+    for entry in parsed_entries:
+        title = normalize_feed_text(entry.get("title", ""))
+        entries.append(Entry(
+            source=source,
+            title=title,
+            article_url=entry.get("link", ""),
+            summary=normalize_feed_text(entry.get("summary", ""), title),
+            published=entry.get("published"),
+        ))
+    return entries
+
+
+# Lazily create the process pool used for CPU-bound feed parsing.
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Return the shared parse process pool.
+
+    Workers are spawned rather than forked: forking while download threads hold locks
+    (SQLite, urllib3, logging) can deadlock the child.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=SETTINGS.feed_parse_processes,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+# Parse feed bytes in-thread, or in the process pool when many feeds arrive together.
+def _parse_content(content: bytes, use_processes: bool) -> Dict:
+    """Return parse_feed_content output using the configured engine."""
+    if use_processes:
+        return _get_parse_pool().submit(parse_feed_content, content,
+                                        SETTINGS.feed_parser_engine).result()
+    return parse_feed_content(content, SETTINGS.feed_parser_engine)
+
+
+# Fetch and parse a single source, capturing failures instead of raising.
+def _fetch_source(source: str, timeout: float, cached: Optional[Dict] = None,
+                  use_processes: bool = False) -> Dict:
+    """Return a feed result dict (source, entries, status, error, elapsed, cache validators)."""
+    started = time.monotonic()
+    result = {"source": source, "entries": [], "status": "ok", "error": "",
+              "not_modified": False, "bytes": 0, "parse_error": ""}
+    try:
+        if source.startswith(("http://", "https://")):
+            download = _download_feed(source, timeout, cached)
+            content = download["content"]
+            content_hash = hashlib.sha1(content).hexdigest() if content else ""
+            result["etag"] = download["etag"]
+            result["last_modified"] = download["last_modified"]
+            result["bytes"] = len(content)
+            if cached and (download["status_code"] == 304
+                           or content_hash == cached.get("content_hash")):
+                result["not_modified"] = True
+                result["content_hash"] = cached.get("content_hash", "")
+                result["entries"] = cached.get("entries", [])
+                result["elapsed"] = time.monotonic() - started
+                return result
+            result["content_hash"] = content_hash
+            parsed = _parse_content(content, use_processes)
+        else:
+            parsed = parse_feed_content(source, engine="feedparser")
+        result["parse_error"] = parsed["parse_error"]
+        if parsed["parse_error"] and not parsed["entries"]:
+            result["status"] = "error"
+            result["error"] = f"Parse error: {result['parse_error']}"
+        else:
+            result["entries"] = _normalize_entries(source, parsed["entries"])
+    except requests.Timeout as exc:
+        result["status"] = "timeout"
+        result["error"] = str(exc) or f"Timed out after {timeout:.0f}s"
+    except Exception as exc:
+        result["status"] = "error"
+        result["error"] = str(exc)
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+
+# Canonicalize a freshly parsed result; runs on the consuming thread so SQLite writes stay serial.
+def _canonicalize_result(result: Dict) -> Dict:
+    """Rewrite the result's entry URLs in place (cached and failed results are left alone)."""
+    if SETTINGS.canonicalize_urls and result["status"] == "ok" and not result["not_modified"]:
+        result["entries"] = canonicalize_entries(result["entries"])
+    return result
+
+
+# Store fresh validators and parsed entries for successfully fetched feeds.
+def _update_feed_cache(cache: Dict[str, Dict], results: List[Dict]) -> bool:
+    """Refresh cache records from feed results; returns True if anything changed."""
+    changed = False
+    for result in results:
+        if result["status"] != "ok" or not result.get("content_hash"):
+            continue
+        record = {
+            "etag": result.get("etag", ""),
+            "last_modified": result.get("last_modified", ""),
+            "content_hash": result["content_hash"],
+            "fetched_at": datetime.utcnow().isoformat(),
+            "entries": result["entries"],
+        }
+        if result["not_modified"]:
+            cache.setdefault(result["source"], record)["fetched_at"] = record["fetched_at"]
+        else:
+            cache[result["source"]] = record
+        changed = True
+    return changed
+
+
+# Strip whitespace and drop repeated sources while keeping their order.
+def _unique_sources(sources: List[str]) -> List[str]:
+    """Return cleaned, de-duplicated source URLs in first-seen order."""
+    return list(dict.fromkeys(source.strip() for source in sources if source and source.strip()))
+
+
+# Fetch sources on a bounded worker pool, yielding each result as it completes.
+def iter_feeds(sources: List[str], max_workers: Optional[int] = None,
+               timeout: Optional[float] = None,
+               registry: Optional[Dict[str, Dict]] = None) -> Iterator[Dict]:
+    """Yield feed results in completion order, registering every finished fetch."""
+    sources = _unique_sources(sources)
+    if not sources:
+        return
+    max_workers = max_workers or SETTINGS.rss_max_workers
+    timeout = timeout or SETTINGS.rss_fetch_timeout
+    cache = load_feed_cache(SETTINGS.feed_cache_path) if SETTINGS.use_feed_cache else {}
+    due, skipped = split_due_sources(sources)
+    if skipped:
+        print(f"[rss] Skipping {len(skipped)} feeds that are backing off until their next due time.")
+    results: Dict[str, Dict] = {}
+    for source in skipped:
+        # Backed-off feeds still contribute their last cached parse, if any.
+        result = {"source": source, "entries": (cache.get(source) or {}).get("entries", []),
+                  "status": "skipped", "error": "", "not_modified": False, "bytes": 0,
+                  "parse_error": "", "elapsed": 0.0}
+        results[source] = result
+        if registry is not None:
+            registry[source] = result
+        yield result
+    if not due:
+        return
+    workers = max(1, min(max_workers, len(due)))
+    use_processes = (SETTINGS.feed_parse_processes > 0
+                     and len(due) >= SETTINGS.feed_parse_process_threshold)
+    if use_processes:
+        # Start the parse pool before any download thread exists.
+        _get_parse_pool()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(_fetch_source, source, timeout, cache.get(source), use_processes)
+               for source in due]
+    try:
+        for future in as_completed(futures):
+            result = _canonicalize_result(future.result())
+            results[result["source"]] = result
+            if registry is not None:
+                registry[result["source"]] = result
+            yield result
+    finally:
+        # When the caller stops early, let in-flight fetches finish so they are
+        # still registered and cached, but drop the ones that never started.
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures:
+            if future.done() and not future.cancelled():
+                result = future.result()
+                if result["source"] in results:
+                    continue
+                results[result["source"]] = _canonicalize_result(result)
+                if registry is not None:
+                    registry.setdefault(result["source"], result)
+        record_feed_results(list(results.values()))
+        if SETTINGS.use_feed_cache and _update_feed_cache(cache, list(results.values())):
+            save_feed_cache(SETTINGS.feed_cache_path, cache)
+        reused = sum(1 for result in results.values() if result["not_modified"])
+        if reused:
+            print(f"[rss] Reused cached parse for {reused}/{len(results)} unchanged feeds.")
+
+
+# Fetch all sources on a bounded worker pool; results keep the input order.
+def fetch_feeds(sources: List[str], max_workers: Optional[int] = None,
+                timeout: Optional[float] = None) -> List[Dict]:
+    """Fetch sources concurrently and return one result dict per source, in input order."""
+    results = {result["source"]: result for result in iter_feeds(sources, max_workers, timeout)}
+    return [results[source] for source in _unique_sources(sources)]
+
+
+# Print a single feed failure as soon as it is known.
+def _print_feed_failure(result: Dict) -> None:
+    """Print the status, latency, and error for a failed feed."""
+    print(f"[rss] Feed {result['status']} ({result['elapsed']:.1f}s): "
+          f"{result['source']} - {result['error']}")
+
+
+# Print a summary of sources that timed out or failed.
+def report_feed_failures(results: List[Dict]) -> None:
+    """Print which feeds timed out or failed so missing entries are visible."""
+    failed = [result for result in results if result["status"] not in ("ok", "skipped")]
+    for result in failed:
+        _print_feed_failure(result)
+    if failed:
+        print(f"[rss] {len(failed)}/{len(results)} feeds failed or timed out.")
 
 
 # Retrieve RSS data from all sources and normalize into entry dictionaries.
-def fetch_rss_entries(sources: List[str]) -> List[Dict]:
-    """Download RSS feeds and normalize them into a list of entry dictionaries."""
-    entries: List[Dict] = []
+def fetch_rss_entries(sources: List[str]) -> List[Entry]:
+    """Download RSS feeds concurrently and merge their entries in source order."""
+    results = fetch_feeds(sources)
+    report_feed_failures(results)
+    entries: List[Entry] = []
+    for result in results:
+        entries.extend(result["entries"])
+    return entries
+
+
+# Fetch the union of every brand's sources once for the whole run.
+def build_feed_registry(source_lists: List[List[str]]) -> Dict[str, Dict]:
+    """Fetch each unique source once and return feed results keyed by source URL."""
+    sources = _unique_sources([source for sources in source_lists for source in sources])
+    results = fetch_feeds(sources)
+    report_feed_failures(results)
+    return {result["source"]: result for result in results}
+
+
+# Build one brand's entry list from the run-scoped feed registry.
+def _registry_entries(registry: Dict[str, Dict], sources: List[str]) -> List[Entry]:
+    """Return registry entries for sources, fetching any not yet registered."""
+    sources = _unique_sources(sources)
+    missing = [source for source in sources if source not in registry]
+    if missing:
+        registry.update(build_feed_registry([missing]))
+    entries: List[Entry] = []
     for source in sources:
-        feed = feedparser.parse(source)
-        for entry in feed.entries:
-            published = None
-            if entry.get("published_parsed"):
-                published = datetime(*entry.published_parsed[:6])
-            entries.append({
-                "source": source,
-                "title": entry.get("title", ""),
-                "article_url": entry.get("link", ""),
-                "summary": entry.get("summary", ""),
-                "published": published,
-            })
+        entries.extend(registry[source]["entries"])
     return entries
 
 
+# Build the title + URL key used to detect exact duplicates.
+def _dedupe_key(entry: Entry) -> Tuple[str, str]:
+    """Return the normalized (title, canonical URL) key for an entry."""
+    return (entry.title.strip().lower(), entry.history_key().strip())
+
+
 # Remove duplicate RSS entries based on title + URL.
-def dedupe_entries(entries: List[Dict]) -> List[Dict]:
+def dedupe_entries(entries: List[Entry]) -> List[Entry]:
     """Remove duplicate entries based on title + URL keys."""
     seen = set()
     unique_entries = []
     for entry in entries:
-        key = (entry.get("title", "").strip().lower(), entry.get("url",
-                                                                 "").strip())
+        key = _dedupe_key(entry)
         if key in seen:
             continue
         seen.add(key)
@@ -40,16 +329,139 @@ def dedupe_entries(entries: List[Dict]) -> List[Dict]:
 
 
 # Sort RSS entries so newest items are processed first.
-def sort_entries_newest(entries: List[Dict]) -> List[Dict]:
+def sort_entries_newest(entries: List[Entry]) -> List[Entry]:
     """Sort entries so the most recent items come first."""
     return sorted(entries,
-                  key=lambda e: e.get("published") or datetime.min,
+                  key=lambda e: e.published or datetime.min,
                   reverse=True)
 
 
 # Orchestrate fetching, deduping, and sorting of RSS entries.
-def ingest_rss(sources: List[str]) -> List[Dict]:
-    """Fetch, dedupe, and sort RSS entries from all configured sources."""
-    entries = fetch_rss_entries(sources)
+def ingest_rss(sources: List[str], registry: Optional[Dict[str, Dict]] = None) -> List[Entry]:
+    """Fetch (or reuse from a run-scoped registry), dedupe, and sort RSS entries."""
+    if registry is None:
+        entries = fetch_rss_entries(sources)
+    else:
+        entries = _registry_entries(registry, sources)
     entries = dedupe_entries(entries)
-    return sort_entries_newest(entries)
+    entries = sort_entries_newest(entries)
+    if SETTINGS.cluster_near_duplicates:
+        entries = cluster_near_duplicates(entries)
+    return entries
+
+
+# Pass feed results through, printing failures as they arrive.
+def _report_as_completed(results: Iterable[Dict]) -> Iterator[Dict]:
+    """Yield feed results unchanged after reporting any failure."""
+    for result in results:
+        if result["status"] not in ("ok", "skipped"):
+            _print_feed_failure(result)
+        yield result
+
+
+# Reduce a title to the word set used for near-duplicate comparison.
+def _title_tokens(title: str) -> frozenset:
+    """Lowercase title words without stopwords or a trailing " - Publisher" suffix."""
+    title = re.sub(r"\s+[-|\u2013\u2014]\s+[^-|\u2013\u2014]{1,60}$", "", title or "")
+    words = re.findall(r"[a-z0-9]+", title.lower())
+    return frozenset(word for word in words if len(word) > 2 and word not in TITLE_STOPWORDS)
+
+
+# Compute a MinHash signature over a token set.
+def _minhash_signature(tokens: frozenset) -> List[int]:
+    """Return one minimum hash per permutation in _MINHASH_PARAMS."""
+    hashed = [
+        int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+        for token in tokens
+    ]
+    return [min((a * value + b) % _MINHASH_PRIME for value in hashed) for a, b in _MINHASH_PARAMS]
+
+
+class _NearDuplicateIndex:
+    """Incremental MinHash/LSH index that maps entries to their cluster representative."""
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        self.representatives: List[Tuple[Entry, frozenset]] = []
+
+    def add(self, entry: Entry) -> Optional[Entry]:
+        """Return the representative if entry is a near duplicate; otherwise register it."""
+        tokens = _title_tokens(entry.title)
+        if len(tokens) < 3:
+            return None
+        signature = _minhash_signature(tokens)
+        band_keys = [
+            (band, tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]))
+            for band in range(MINHASH_BANDS)
+        ]
+        candidates = {index for key in band_keys for index in self.buckets.get(key, [])}
+        for index in sorted(candidates):
+            representative, rep_tokens = self.representatives[index]
+            if len(tokens & rep_tokens) / len(tokens | rep_tokens) >= self.threshold:
+                return representative
+        index = len(self.representatives)
+        self.representatives.append((entry, tokens))
+        for key in band_keys:
+            self.buckets.setdefault(key, []).append(index)
+        return None
+
+
+# Collapse near-duplicate stories, keeping one representative per cluster.
+def cluster_near_duplicates(entries: List[Entry]) -> List[Entry]:
+    """Keep the first entry of each story cluster and list the rest in its duplicates."""
+    index = _NearDuplicateIndex(SETTINGS.near_duplicate_threshold)
+    representatives = []
+    for entry in entries:
+        # Registry entries are shared across brands, so each run gets its own cluster list.
+        entry = entry.evolve(duplicates=[])
+        representative = index.add(entry)
+        if representative is None:
+            representatives.append(entry)
+        else:
+            representative.duplicates.append(entry)
+    collapsed = len(entries) - len(representatives)
+    if collapsed:
+        print(f"[rss] Collapsed {collapsed} near-duplicate entries into existing stories.")
+    return representatives
+
+
+# Stream deduped entries newest-first within a bounded lookahead window.
+def _stream_newest(results: Iterable[Dict], lookahead: int) -> Iterator[Entry]:
+    """Buffer up to lookahead entries and always yield the newest one buffered."""
+    seen = set()
+    heap: List[Tuple[float, int, Entry]] = []
+    clusters = _NearDuplicateIndex(SETTINGS.near_duplicate_threshold)
+    for result in results:
+        for entry in result["entries"]:
+            key = _dedupe_key(entry)
+            if key in seen:
+                continue
+            seen.add(key)
+            if SETTINGS.cluster_near_duplicates:
+                # Members that arrive after their representative was yielded are
+                # still attached, since the consumer holds the same cluster list.
+                entry = entry.evolve(duplicates=[])
+                representative = clusters.add(entry)
+                if representative is not None:
+                    representative.duplicates.append(entry)
+                    continue
+            age = -((entry.published or datetime.min) - datetime.min).total_seconds()
+            heapq.heappush(heap, (age, len(seen), entry))
+            if len(heap) > lookahead:
+                yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+# Yield entries as feeds arrive so processing overlaps with remaining fetches.
+def iter_rss_entries(sources: List[str], registry: Optional[Dict[str, Dict]] = None,
+                     lookahead: Optional[int] = None) -> Iterator[Entry]:
+    """Stream deduped entries newest-first (within the lookahead window) as feeds complete."""
+    sources = _unique_sources(sources)
+    registry = {} if registry is None else registry
+    lookahead = lookahead or SETTINGS.rss_stream_lookahead
+    registered = [registry[source] for source in sources if source in registry]
+    missing = [source for source in sources if source not in registry]
+    fetched = _report_as_completed(iter_feeds(missing, registry=registry))
+    yield from _stream_newest(itertools.chain(registered, fetched), lookahead)
@@ -0,0 +1,150 @@
+import base64
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+import requests
+
+from utils.config import SETTINGS
+from utils.logger import get_canonical_urls, save_canonical_urls
+from utils.models import Entry
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "ref_src", "cmpid", "ocid", "smid", "smtyp", "emc", "partner",
+    "spm", "sr_share",
+}
+TRACKING_PREFIXES = ("utm_", "hsa_", "pk_", "mtm_")
+# Query parameters that carry the real destination on redirect-wrapper pages.
+WRAPPER_PARAMS = ("url", "u", "q", "target", "dest")
+# Hosts whose links only redirect elsewhere and need an HTTP round trip to unwrap.
+REDIRECT_HOSTS = {
+    "news.google.com", "feedproxy.google.com", "feeds.feedburner.com",
+    "t.co", "bit.ly", "ow.ly", "lnkd.in", "dlvr.it",
+}
+_EMBEDDED_URL = re.compile(rb"https?://[\x21-\x7e]+")
+
+
+# Normalize scheme/host/path/query so equivalent URLs compare equal.
+def normalize_url(url: str) -> str:
+    """Lowercase scheme and host, drop www./m./default ports, tracking params, and fragments."""
+    url = (url or "").strip()
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+
+# Extract the destination from wrappers that carry it in the URL itself.
+def _unwrap_static(url: str) -> Optional[str]:
+    """Return the wrapped destination URL if it can be decoded without a request."""
+    parts = urlsplit(url)
+    for key, value in parse_qsl(parts.query):
+        if key.lower() in WRAPPER_PARAMS and unquote(value).startswith(("http://", "https://")):
+            return unquote(value)
+    host = (parts.hostname or "").lower()
+    if host == "news.google.com" and "/articles/" in parts.path:
+        # Older Google News article IDs are base64 protobufs that embed the URL.
+        article_id = parts.path.rsplit("/", 1)[-1]
+        try:
+            decoded = base64.urlsafe_b64decode(article_id + "=" * (-len(article_id) % 4))
+        except (ValueError, TypeError):
+            return None
+        match = _EMBEDDED_URL.search(decoded)
+        if match:
+            return match.group(0).decode("ascii", errors="ignore")
+    return None
+
+
+# Follow HTTP redirects for known redirector hosts.
+def _resolve_redirect(url: str) -> Optional[str]:
+    """Return the final URL after redirects, or None if it could not be resolved."""
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=SETTINGS.url_resolve_timeout)
+        if response.status_code >= 400 or response.url == url:
+            response = requests.get(url, allow_redirects=True, stream=True,
+                                    timeout=SETTINGS.url_resolve_timeout)
+            response.close()
+        return response.url if response.url != url else None
+    except requests.RequestException:
+        return None
+
+
+def _is_redirect_host(url: str) -> bool:
+    return (urlsplit(url).hostname or "").lower() in REDIRECT_HOSTS
+
+
+# Follow redirect wrappers to the real article URL, leaving it otherwise untouched.
+def unwrap_url(url: str, resolve: bool = False) -> str:
+    """Unwrap redirect wrappers (optionally over HTTP); the result is a publishable URL."""
+    current = (url or "").strip()
+    for _ in range(3):
+        unwrapped = _unwrap_static(current)
+        if not unwrapped:
+            break
+        current = unwrapped
+    if resolve and _is_redirect_host(current):
+        resolved = _resolve_redirect(current)
+        if resolved:
+            current = _unwrap_static(resolved) or resolved
+    return current
+
+
+# Produce the canonical form of a single URL.
+def canonicalize_url(url: str, resolve: bool = False) -> str:
+    """Unwrap redirect wrappers and normalize the result into a dedupe key (not for publishing)."""
+    return normalize_url(unwrap_url(url, resolve))
+
+
+def _target_and_key(url: str, resolve: bool) -> Tuple[str, str]:
+    target = unwrap_url(url, resolve)
+    return target, normalize_url(target)
+
+
+# Attach unwrapped targets and canonical keys to entries, using the persistent mapping table.
+def canonicalize_entries(entries: List[Entry]) -> List[Entry]:
+    """Return entries with article_url unwrapped, canonical_url set, and original_url kept."""
+    urls = list(dict.fromkeys(entry.article_url for entry in entries if entry.article_url))
+    if not urls:
+        return entries
+    mapping = get_canonical_urls(SETTINGS.sqlite_path, urls)
+    missing = [url for url in urls if url not in mapping]
+    if missing:
+        if SETTINGS.resolve_redirect_urls:
+            workers = max(1, min(SETTINGS.rss_max_workers, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                resolved = dict(zip(missing, executor.map(
+                    lambda url: _target_and_key(url, resolve=True), missing)))
+        else:
+            resolved = {url: _target_and_key(url, resolve=False) for url in missing}
+        # Links still on a redirector were not resolved (timeout, or resolution off); leave
+        # them unsaved so a later run retries them.
+        save_canonical_urls(SETTINGS.sqlite_path, {
+            url: value for url, value in resolved.items() if not _is_redirect_host(value[0])
+        })
+        mapping.update(resolved)
+    canonical = []
+    for entry in entries:
+        if entry.article_url in mapping:
+            target, key = mapping[entry.article_url]
+            entry = entry.evolve(original_url=entry.original_url or entry.article_url,
+                                 article_url=target, canonical_url=key)
+        canonical.append(entry)
+    return canonical
@@ -1,6 +1,32 @@
 import os
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, List, Tuple
+
+
+def _parse_map(value: str) -> Dict[str, str]:
+    """Parse "name:value,name:value" into a dict (values may contain further colons)."""
+    mapping: Dict[str, str] = {}
+    for item in value.split(","):
+        name, _, entry = item.partition(":")
+        if name.strip() and entry.strip():
+            mapping[name.strip()] = entry.strip()
+    return mapping
+
+
+def _parse_number_map(value: str) -> Dict[str, float]:
+    """Parse "name:number,name:number" into a dict."""
+    return {name: float(number) for name, number in _parse_map(value).items()}
+
+
+def _parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "model=input/output,..." USD-per-million-token prices into a dict."""
+    prices: Dict[str, Tuple[float, float]] = {}
+    for item in value.split(","):
+        model, _, price = item.rpartition("=")
+        input_price, _, output_price = price.partition("/")
+        if model.strip() and input_price.strip():
+            prices[model.strip()] = (float(input_price), float(output_price or input_price))
+    return prices
 
 
 @dataclass
@@ -24,7 +50,7 @@ class Settings:
             "https://news.google.com/rss/search?q=joint+pain+relief+health&hl=en-US&gl=US&ceid=US:en",
             "https://news.google.com/rss/search?q=digestive+health&hl=en-US&gl=US&ceid=US:en",
             "https://news.google.com/rss/search?q=digestive+health&hl=en-US&gl=US&ceid=US:en",
-            "https://www.sciencedaily.com/rss/top/health.xml ",
+            "https://www.sciencedaily.com/rss/top/health.xml",
             "https://www.naturalproductsinsider.com/rss.xml"
         ]
     )
@@ -61,12 +87,98 @@ class Settings:
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     novita_base_url: str = os.getenv("NOVITA_BASE_URL", "https://api.novita.ai/openai")
     novita_model: str = os.getenv("NOVITA_MODEL", "deepseek/deepseek-v3.2")
+    # Per-call-site routing (hardblock, safety, relevance, rerank, caption); unset sites use NOVITA_*.
+    llm_models: Dict[str, str] = field(default_factory=lambda: _parse_map(os.getenv("LLM_MODELS", "")))
+    llm_base_urls: Dict[str, str] = field(
+        default_factory=lambda: _parse_map(os.getenv("LLM_BASE_URLS", ""))
+    )
+    llm_api_keys: Dict[str, str] = field(default_factory=lambda: _parse_map(os.getenv("LLM_API_KEYS", "")))
+    llm_temperatures: Dict[str, float] = field(
+        default_factory=lambda: _parse_number_map(os.getenv("LLM_TEMPERATURES", ""))
+    )
+    llm_max_tokens: Dict[str, float] = field(
+        default_factory=lambda: _parse_number_map(
+            os.getenv("LLM_MAX_TOKENS", "hardblock:64,relevance:64,rerank:12,safety:256")
+        )
+    )
+    llm_timeout: float = float(os.getenv("LLM_TIMEOUT", "60"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    llm_rate_per_second: float = float(os.getenv("LLM_RATE_PER_SECOND", "2"))
+    llm_burst: int = int(os.getenv("LLM_BURST", "4"))
+    llm_retry_base_seconds: float = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+    llm_retry_max_seconds: float = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+    llm_breaker_threshold: int = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+    llm_breaker_cooldown: float = float(os.getenv("LLM_BREAKER_COOLDOWN", "300"))
+    llm_prices: Dict[str, Tuple[float, float]] = field(
+        default_factory=lambda: _parse_prices(os.getenv("LLM_PRICES", ""))
+    )
     relevance_threshold: float = float(os.getenv("RELEVANCE_THRESHOLD", "0.4"))
+    catalog_digest_max_tokens: int = int(os.getenv("CATALOG_DIGEST_MAX_TOKENS", "4000"))
+    relevance_top_k: int = int(os.getenv("RELEVANCE_TOP_K", "12"))
+    use_semantic_filter: bool = os.getenv("USE_SEMANTIC_FILTER", "true").lower() == "true"
+    semantic_min_similarity: float = float(os.getenv("SEMANTIC_MIN_SIMILARITY", "0.05"))
+    semantic_dimensions: int = int(os.getenv("SEMANTIC_DIMENSIONS", "64"))
+    semantic_index_dir: str = os.getenv("SEMANTIC_INDEX_DIR", "data/semantic_index")
     product_match_threshold: float = float(os.getenv("PRODUCT_MATCH_THRESHOLD", "0.1"))
+    match_priority_weight: float = float(os.getenv("MATCH_PRIORITY_WEIGHT", "0.5"))
+    recency_half_life_hours: float = float(os.getenv("RECENCY_HALF_LIFE_HOURS", "24"))
     use_ai_rerank: bool = os.getenv("USE_AI_RERANK", "true").lower() == "true"
     ai_rerank_top_n: int = int(os.getenv("AI_RERANK_TOP_N", "5"))
+    ai_rerank_skip_gap: float = float(os.getenv("AI_RERANK_SKIP_GAP", "0.5"))
+    safety_batch_size: int = int(os.getenv("SAFETY_BATCH_SIZE", "8"))
+    safety_classifier_mode: str = os.getenv("SAFETY_CLASSIFIER_MODE", "combined")
+    check_cascade: List[str] = field(
+        default_factory=lambda: [
+            stage.strip()
+            for stage in os.getenv(
+                "CHECK_CASCADE",
+                "hardblock_keywords,keyword_match,semantic,image,ai_safety,product_select",
+            ).split(",")
+            if stage.strip()
+        ]
+    )
+    use_llm_cache: bool = os.getenv("USE_LLM_CACHE", "true").lower() == "true"
+    llm_cache_max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+    llm_cache_ttl_hours: Dict[str, float] = field(
+        default_factory=lambda: _parse_number_map(
+            os.getenv(
+                "LLM_CACHE_TTL_HOURS",
+                "hardblock:720,safety:168,relevance:168,rerank:168,caption:24",
+            )
+        )
+    )
     avoid_repeat_product: bool = os.getenv("AVOID_REPEAT_PRODUCT", "true").lower() == "true"
     avoid_repeat_product_count: int = int(os.getenv("AVOID_REPEAT_PRODUCT_COUNT", "2"))
+    rss_max_workers: int = int(os.getenv("RSS_MAX_WORKERS", "8"))
+    rss_fetch_timeout: float = float(os.getenv("RSS_FETCH_TIMEOUT", "20"))
+    use_feed_cache: bool = os.getenv("USE_FEED_CACHE", "true").lower() == "true"
+    feed_cache_path: str = os.getenv("FEED_CACHE_PATH", "data/feed_cache.json")
+    rss_streaming: bool = os.getenv("RSS_STREAMING", "false").lower() == "true"
+    rss_stream_lookahead: int = int(os.getenv("RSS_STREAM_LOOKAHEAD", "25"))
+    cluster_near_duplicates: bool = os.getenv("CLUSTER_NEAR_DUPLICATES", "true").lower() == "true"
+    near_duplicate_threshold: float = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.6"))
+    canonicalize_urls: bool = os.getenv("CANONICALIZE_URLS", "true").lower() == "true"
+    resolve_redirect_urls: bool = os.getenv("RESOLVE_REDIRECT_URLS", "false").lower() == "true"
+    url_resolve_timeout: float = float(os.getenv("URL_RESOLVE_TIMEOUT", "10"))
+    adaptive_feed_polling: bool = os.getenv("ADAPTIVE_FEED_POLLING", "true").lower() == "true"
+    feed_backoff_base_hours: float = float(os.getenv("FEED_BACKOFF_BASE_HOURS", "12"))
+    feed_backoff_max_hours: float = float(os.getenv("FEED_BACKOFF_MAX_HOURS", "168"))
+    feed_stale_after: int = int(os.getenv("FEED_STALE_AFTER", "3"))
+    feed_stale_days: int = int(os.getenv("FEED_STALE_DAYS", "14"))
+    feed_parser_engine: str = os.getenv("FEED_PARSER_ENGINE", "fast")
+    feed_parse_processes: int = int(os.getenv("FEED_PARSE_PROCESSES", "2"))
+    feed_parse_process_threshold: int = int(os.getenv("FEED_PARSE_PROCESS_THRESHOLD", "6"))
+    fetch_article_bodies: bool = os.getenv("FETCH_ARTICLE_BODIES", "false").lower() == "true"
+    article_cache_dir: str = os.getenv("ARTICLE_CACHE_DIR", "data/article_cache")
+    article_max_workers: int = int(os.getenv("ARTICLE_MAX_WORKERS", "8"))
+    article_per_host_limit: int = int(os.getenv("ARTICLE_PER_HOST_LIMIT", "2"))
+    article_fetch_timeout: float = float(os.getenv("ARTICLE_FETCH_TIMEOUT", "15"))
+    article_fetch_window: int = int(os.getenv("ARTICLE_FETCH_WINDOW", "8"))
+    article_retry_hours: float = float(os.getenv("ARTICLE_RETRY_HOURS", "24"))
+    article_body_max_chars: int = int(os.getenv("ARTICLE_BODY_MAX_CHARS", "6000"))
+    article_excerpt_chars: int = int(os.getenv("ARTICLE_EXCERPT_CHARS", "1200"))
+    article_token_budget: int = int(os.getenv("ARTICLE_TOKEN_BUDGET", "256"))
 
 
 SETTINGS = Settings()
@@ -0,0 +1,305 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APIError, APIStatusError, AsyncOpenAI, OpenAI, RateLimitError
+
+from utils.config import SETTINGS
+from utils.llm_usage import record_llm_call
+
+# Clients are keyed by (base_url, api_key) so routed call sites share connections per endpoint.
+_clients: Dict[Tuple[str, str], OpenAI] = {}
+_slots = threading.BoundedSemaphore(SETTINGS.llm_max_concurrency)
+_lock = threading.Lock()
+# Async clients and limits are bound to the event loop they were created on.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AsyncOpenAI]]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+class LLMUnavailableError(RuntimeError):
+    """The LLM service is unreachable or overloaded; this is not a verdict on the content."""
+
+
+@dataclass(frozen=True)
+class LLMRoute:
+    """Model, endpoint, and sampling settings for one call site."""
+
+    model: str
+    base_url: str
+    api_key: str
+    temperature: float
+    max_tokens: int = 0  # 0 leaves the provider default
+
+
+class TokenBucket:
+    """Process-wide request rate limiter (rate tokens per second, up to capacity in a burst)."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failed calls; after `cooldown` seconds a single
+    trial call is let through (half-open), and its failure re-opens the breaker."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def available(self) -> bool:
+        """True when closed, or when the cooldown is over and no trial call is in flight."""
+        with self.lock:
+            return self.opened_at is None or (
+                not self.probing and time.monotonic() - self.opened_at >= self.cooldown
+            )
+
+    def allow(self) -> bool:
+        """Admit a call; while half-open only the first caller becomes the trial call."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"[llm] Circuit breaker open after {self.failures} consecutive failures.")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+_bucket = TokenBucket(SETTINGS.llm_rate_per_second, SETTINGS.llm_burst)
+_breaker = CircuitBreaker(SETTINGS.llm_breaker_threshold, SETTINGS.llm_breaker_cooldown)
+
+
+def llm_available() -> bool:
+    """False while the circuit breaker is open or its trial call is in flight."""
+    return _breaker.available()
+
+
+# Resolve where and how a call site's requests are sent.
+def llm_route(call_site: str, model: Optional[str] = None, temperature: float = 0) -> LLMRoute:
+    """Return the call site's route; LLM_MODELS etc. override the caller's model and temperature."""
+    return LLMRoute(
+        model=SETTINGS.llm_models.get(call_site) or model or SETTINGS.novita_model,
+        base_url=SETTINGS.llm_base_urls.get(call_site) or SETTINGS.novita_base_url,
+        api_key=SETTINGS.llm_api_keys.get(call_site) or SETTINGS.novita_api_key,
+        temperature=SETTINGS.llm_temperatures.get(call_site, temperature),
+        max_tokens=int(SETTINGS.llm_max_tokens.get(call_site, 0)),
+    )
+
+
+def _client_options(base_url: str, api_key: str) -> Dict[str, Any]:
+    return {
+        "api_key": api_key,
+        "base_url": base_url,
+        "timeout": SETTINGS.llm_timeout,
+        # Retries are handled here so they share the rate limiter and circuit breaker.
+        "max_retries": 0,
+    }
+
+
+# One process-wide client per endpoint so keep-alive connections and TLS sessions are reused.
+def get_client(base_url: str = "", api_key: str = "") -> OpenAI:
+    """Return the shared OpenAI-compatible client for an endpoint (NovitaAI by default)."""
+    endpoint = (base_url or SETTINGS.novita_base_url, api_key or SETTINGS.novita_api_key)
+    with _lock:
+        if endpoint not in _clients:
+            _clients[endpoint] = OpenAI(**_client_options(*endpoint))
+        return _clients[endpoint]
+
+
+def get_async_client(base_url: str = "", api_key: str = "") -> AsyncOpenAI:
+    """Return the shared async client for an endpoint and the running event loop."""
+    loop = asyncio.get_running_loop()
+    endpoint = (base_url or SETTINGS.novita_base_url, api_key or SETTINGS.novita_api_key)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if endpoint not in clients:
+            clients[endpoint] = AsyncOpenAI(**_client_options(*endpoint))
+            _async_slots.setdefault(loop, asyncio.Semaphore(SETTINGS.llm_max_concurrency))
+        return clients[endpoint]
+
+
+def _is_retryable(exc: APIError) -> bool:
+    """Rate limits, server errors, timeouts, and connection failures are worth retrying."""
+    if isinstance(exc, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code >= 500
+
+
+def _retry_delay(attempt: int, exc: APIError) -> float:
+    """Full-jitter exponential backoff, honoring a numeric Retry-After header."""
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after", "") if response is not None else ""
+    if retry_after.replace(".", "", 1).isdigit():
+        return min(float(retry_after), SETTINGS.llm_retry_max_seconds)
+    cap = min(SETTINGS.llm_retry_max_seconds, SETTINGS.llm_retry_base_seconds * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+def _check_breaker() -> None:
+    if not _breaker.allow():
+        raise LLMUnavailableError("LLM circuit breaker is open; skipping call")
+
+
+def _give_up(exc: APIError) -> LLMUnavailableError:
+    _breaker.record_failure()
+    return LLMUnavailableError(f"LLM request failed after {SETTINGS.llm_max_retries + 1} attempts: {exc}")
+
+
+def _send(request: Callable[[], Any]) -> Any:
+    """Run a request through the rate limiter, retries, and circuit breaker."""
+    _check_breaker()
+    for attempt in range(SETTINGS.llm_max_retries + 1):
+        _bucket.acquire()
+        try:
+            with _slots:
+                response = request()
+        except APIError as exc:
+            if not _is_retryable(exc):
+                # The service answered, so this is not an outage (and frees a half-open trial).
+                _breaker.record_success()
+                raise
+            if attempt == SETTINGS.llm_max_retries:
+                raise _give_up(exc) from exc
+            delay = _retry_delay(attempt, exc)
+            print(f"[llm] Retrying in {delay:.1f}s after: {exc}")
+            time.sleep(delay)
+            continue
+        except Exception:
+            # Unexpected errors still settle a half-open trial rather than leaving it pending.
+            _breaker.record_failure()
+            raise
+        _breaker.record_success()
+        return response
+
+
+async def _asend(request: Callable[[], Awaitable[Any]]) -> Any:
+    """Async variant of _send."""
+    _check_breaker()
+    for attempt in range(SETTINGS.llm_max_retries + 1):
+        await _bucket.aacquire()
+        try:
+            async with _async_slots[asyncio.get_running_loop()]:
+                response = await request()
+        except APIError as exc:
+            if not _is_retryable(exc):
+                # The service answered, so this is not an outage (and frees a half-open trial).
+                _breaker.record_success()
+                raise
+            if attempt == SETTINGS.llm_max_retries:
+                raise _give_up(exc) from exc
+            delay = _retry_delay(attempt, exc)
+            print(f"[llm] Retrying in {delay:.1f}s after: {exc}")
+            await asyncio.sleep(delay)
+            continue
+        except Exception:
+            # Unexpected errors still settle a half-open trial rather than leaving it pending.
+            _breaker.record_failure()
+            raise
+        _breaker.record_success()
+        return response
+
+
+def _reply_text(response) -> str:
+    return (response.choices[0].message.content or "").strip()
+
+
+def _route_options(call_site: str, model: Optional[str], temperature: float,
+                   options: Dict[str, Any]) -> Tuple[LLMRoute, Dict[str, Any]]:
+    """Resolve the route and apply its max_tokens cap unless the caller passed a non-zero one."""
+    route = llm_route(call_site, model, temperature)
+    max_tokens = options.pop("max_tokens", 0) or route.max_tokens
+    if max_tokens:
+        options["max_tokens"] = max_tokens
+    return route, options
+
+
+# Send one chat completion through the call site's route and the shared gateway.
+def chat_completion(messages: List[Dict], model: Optional[str] = None,
+                    temperature: float = 0, call_site: str = "", **options: Any) -> str:
+    """Return the reply text; raises LLMUnavailableError when the service is down."""
+    route, options = _route_options(call_site, model, temperature, options)
+    client = get_client(route.base_url, route.api_key)
+    model = route.model
+    started = time.monotonic()
+    try:
+        response = _send(lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=route.temperature,
+            **options,
+        ))
+    except Exception:
+        record_llm_call(call_site, model, None, time.monotonic() - started, status="error")
+        raise
+    record_llm_call(call_site, model, response, time.monotonic() - started)
+    return _reply_text(response)
+
+
+async def achat_completion(messages: List[Dict], model: Optional[str] = None,
+                           temperature: float = 0, call_site: str = "", **options: Any) -> str:
+    """Async variant of chat_completion."""
+    route, options = _route_options(call_site, model, temperature, options)
+    client = get_async_client(route.base_url, route.api_key)
+    model = route.model
+    started = time.monotonic()
+    try:
+        response = await _asend(lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=route.temperature,
+            **options,
+        ))
+    except Exception:
+        record_llm_call(call_site, model, None, time.monotonic() - started, status="error")
+        raise
+    record_llm_call(call_site, model, response, time.monotonic() - started)
+    return _reply_text(response)
@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict
+
+from utils.config import SETTINGS
+from utils.logger import get_recent_llm_runs, log_llm_call, save_llm_run, summarize_llm_calls
+
+# Run and brand that LLM calls are attributed to.
+_context: Dict[str, str] = {"run_id": "", "brand_name": "", "started_at": ""}
+_lock = threading.Lock()
+
+
+def start_llm_run() -> str:
+    """Begin attributing LLM calls to a new run id and return it."""
+    run_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    with _lock:
+        _context.update(run_id=run_id, brand_name="", started_at=datetime.utcnow().isoformat())
+    return run_id
+
+
+def set_llm_brand(brand_name: str) -> None:
+    """Attribute subsequent LLM calls to brand_name."""
+    with _lock:
+        _context["brand_name"] = brand_name
+
+
+# Price a completion from LLM_PRICES (USD per million input/output tokens).
+def _cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = SETTINGS.llm_prices.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def record_llm_call(call_site: str, model: str, response: Any, latency: float, status: str = "ok") -> None:
+    """Persist token usage, latency, and cost for one completion (response may be None on errors)."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    with _lock:
+        run_id, brand_name = _context["run_id"], _context["brand_name"]
+    try:
+        log_llm_call(
+            SETTINGS.sqlite_path,
+            {
+                "run_id": run_id,
+                "brand_name": brand_name,
+                "call_site": call_site,
+                "model": model,
+                "status": status,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "latency_ms": int(latency * 1000),
+                "cost_usd": _cost(model, prompt_tokens, completion_tokens),
+            },
+        )
+    except sqlite3.Error as exc:
+        print(f"[llm-usage] Could not record LLM call: {exc}")
+
+
+# Print the run's per-brand, per-call-site usage and persist its totals.
+def report_llm_usage(scheduled_posts: int, persist: bool = True) -> None:
+    """Summarize the current run and compare its cost per scheduled post with recent runs.
+
+    Pass persist=False for previews so they do not enter the recent-runs comparison.
+    """
+    with _lock:
+        run_id, started_at = _context["run_id"], _context["started_at"]
+    if not run_id:
+        return
+    rows = summarize_llm_calls(SETTINGS.sqlite_path, run_id)
+    totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0, "cost_usd": 0.0}
+    for row in rows:
+        print(
+            f"[llm-usage] {row['brand_name'] or '-'} / {row['call_site']}: {row['calls']} calls "
+            f"({row['errors']} errors), {row['prompt_tokens']}+{row['completion_tokens']} tokens, "
+            f"{row['latency_ms'] / 1000:.1f}s, ${row['cost_usd']:.4f}"
+        )
+        for key in totals:
+            totals[key] += row[key] or 0
+    print(
+        f"[llm-usage] Run {run_id}: {totals['calls']} calls, "
+        f"{totals['prompt_tokens']}+{totals['completion_tokens']} tokens, "
+        f"{totals['latency_ms'] / 1000:.1f}s, ${totals['cost_usd']:.4f}, "
+        f"{scheduled_posts} scheduled posts"
+    )
+    if scheduled_posts:
+        cost_per_post = totals["cost_usd"] / scheduled_posts
+        previous = [run["cost_usd"] / run["scheduled_posts"]
+                    for run in get_recent_llm_runs(SETTINGS.sqlite_path, exclude_run_id=run_id)
+                    if run["scheduled_posts"]]
+        message = f"[llm-usage] Cost per scheduled post: ${cost_per_post:.4f}"
+        if previous:
+            message += f" (recent average ${sum(previous) / len(previous):.4f})"
+        print(message)
+    if not persist:
+        return
+    save_llm_run(
+        SETTINGS.sqlite_path,
+        {
+            **totals,
+            "run_id": run_id,
+            "started_at": started_at,
+            "finished_at": datetime.utcnow().isoformat(),
+            "scheduled_posts": scheduled_posts,
+        },
+    )
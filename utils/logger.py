@@ -2,7 +2,7 @@ import json
 import os
 import sqlite3
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Tuple
 
 
 # Ensure the directory for a file path exists.
@@ -79,6 +79,101 @@ def init_db(sqlite_path: str) -> None:
             )
             """
         )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS url_canonical (
+                original_url TEXT PRIMARY KEY,
+                target_url TEXT,
+                canonical_url TEXT,
+                resolved_at TEXT
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feed_fetches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fetched_at TEXT,
+                source TEXT,
+                status TEXT,
+                latency_ms INTEGER,
+                bytes INTEGER,
+                entry_count INTEGER,
+                not_modified INTEGER,
+                parse_error TEXT,
+                error TEXT
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feed_health (
+                source TEXT PRIMARY KEY,
+                last_fetched_at TEXT,
+                last_success_at TEXT,
+                last_new_content_at TEXT,
+                consecutive_failures INTEGER DEFAULT 0,
+                consecutive_stale INTEGER DEFAULT 0,
+                total_fetches INTEGER DEFAULT 0,
+                total_failures INTEGER DEFAULT 0,
+                total_yield INTEGER DEFAULT 0,
+                next_due_at TEXT
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                call_site TEXT,
+                model TEXT,
+                temperature REAL,
+                response TEXT,
+                created_at TEXT,
+                expires_at TEXT,
+                last_used_at TEXT,
+                hits INTEGER DEFAULT 0
+            )
+            """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)"
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT,
+                run_id TEXT,
+                brand_name TEXT,
+                call_site TEXT,
+                model TEXT,
+                status TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                latency_ms INTEGER,
+                cost_usd REAL
+            )
+            """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_calls_run ON llm_calls (run_id)"
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_runs (
+                run_id TEXT PRIMARY KEY,
+                started_at TEXT,
+                finished_at TEXT,
+                scheduled_posts INTEGER,
+                calls INTEGER,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                latency_ms INTEGER,
+                cost_usd REAL
+            )
+            """
+        )
         cursor.execute("PRAGMA table_info(post_log)")
         columns = {row[1] for row in cursor.fetchall()}
         if "product_name" not in columns:
@@ -179,6 +274,344 @@ def record_article_check(
         conn.commit()
 
 
+def get_canonical_urls(sqlite_path: str, urls: list[str]) -> Dict[str, Tuple[str, str]]:
+    """Return known original_url -> (target_url, canonical_url) mappings for the given URLs."""
+    urls = [url for url in urls if url]
+    if not urls:
+        return {}
+    _ensure_dir(sqlite_path)
+    mapping: Dict[str, Tuple[str, str]] = {}
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(
+                "SELECT original_url, target_url, canonical_url FROM url_canonical "
+                f"WHERE original_url IN ({placeholders})",
+                chunk,
+            )
+            mapping.update({row[0]: (row[1], row[2]) for row in cursor.fetchall()})
+    return mapping
+
+
+def save_canonical_urls(sqlite_path: str, mapping: Dict[str, Tuple[str, str]]) -> None:
+    """Persist original_url -> (target_url, canonical_url) mappings."""
+    if not mapping:
+        return
+    _ensure_dir(sqlite_path)
+    resolved_at = datetime.utcnow().isoformat()
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO url_canonical (original_url, target_url, canonical_url, resolved_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(original_url) DO UPDATE SET
+                target_url=excluded.target_url,
+                canonical_url=excluded.canonical_url,
+                resolved_at=excluded.resolved_at
+            """,
+            [(original, target, canonical, resolved_at)
+             for original, (target, canonical) in mapping.items()],
+        )
+        conn.commit()
+
+
+def log_feed_fetches(sqlite_path: str, results: list[Dict]) -> None:
+    """Insert one feed_fetches row per fetched feed result."""
+    if not results:
+        return
+    _ensure_dir(sqlite_path)
+    fetched_at = datetime.utcnow().isoformat()
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO feed_fetches (
+                fetched_at,
+                source,
+                status,
+                latency_ms,
+                bytes,
+                entry_count,
+                not_modified,
+                parse_error,
+                error
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    fetched_at,
+                    result.get("source"),
+                    result.get("status"),
+                    int(result.get("elapsed", 0) * 1000),
+                    result.get("bytes", 0),
+                    len(result.get("entries", [])),
+                    int(bool(result.get("not_modified"))),
+                    result.get("parse_error", ""),
+                    result.get("error", ""),
+                )
+                for result in results
+            ],
+        )
+        conn.commit()
+
+
+def get_feed_health(sqlite_path: str, sources: list[str]) -> Dict[str, Dict]:
+    """Return feed_health rows keyed by source for the given sources."""
+    if not sources:
+        return {}
+    _ensure_dir(sqlite_path)
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        placeholders = ", ".join("?" for _ in sources)
+        cursor.execute(
+            f"SELECT * FROM feed_health WHERE source IN ({placeholders})",
+            list(sources),
+        )
+        return {row["source"]: dict(row) for row in cursor.fetchall()}
+
+
+def upsert_feed_health(sqlite_path: str, rows: list[Dict]) -> None:
+    """Insert or update feed_health rows (total_yield is only changed by record_feed_yield)."""
+    if not rows:
+        return
+    _ensure_dir(sqlite_path)
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO feed_health (
+                source,
+                last_fetched_at,
+                last_success_at,
+                last_new_content_at,
+                consecutive_failures,
+                consecutive_stale,
+                total_fetches,
+                total_failures,
+                next_due_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source) DO UPDATE SET
+                last_fetched_at=excluded.last_fetched_at,
+                last_success_at=excluded.last_success_at,
+                last_new_content_at=excluded.last_new_content_at,
+                consecutive_failures=excluded.consecutive_failures,
+                consecutive_stale=excluded.consecutive_stale,
+                total_fetches=excluded.total_fetches,
+                total_failures=excluded.total_failures,
+                next_due_at=excluded.next_due_at
+            """,
+            [
+                (
+                    row.get("source"),
+                    row.get("last_fetched_at"),
+                    row.get("last_success_at"),
+                    row.get("last_new_content_at"),
+                    row.get("consecutive_failures", 0),
+                    row.get("consecutive_stale", 0),
+                    row.get("total_fetches", 0),
+                    row.get("total_failures", 0),
+                    row.get("next_due_at"),
+                )
+                for row in rows
+            ],
+        )
+        conn.commit()
+
+
+def record_feed_yield(sqlite_path: str, source: str) -> None:
+    """Count an entry from this feed that reached scheduled/posted."""
+    if not source:
+        return
+    _ensure_dir(sqlite_path)
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO feed_health (source, total_yield) VALUES (?, 1)
+            ON CONFLICT(source) DO UPDATE SET total_yield = total_yield + 1
+            """,
+            (source,),
+        )
+        conn.commit()
+
+
+def get_llm_cache(sqlite_path: str, cache_key: str) -> str | None:
+    """Return an unexpired cached LLM response and bump its LRU timestamp and hit count."""
+    now = datetime.utcnow().isoformat()
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT response FROM llm_cache WHERE cache_key = ? AND expires_at > ?",
+            (cache_key, now),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        cursor.execute(
+            "UPDATE llm_cache SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?",
+            (now, cache_key),
+        )
+        conn.commit()
+        return row[0]
+
+
+def save_llm_cache(sqlite_path: str, payload: Dict, max_entries: int) -> None:
+    """Store an LLM response, then drop expired rows and the least recently used beyond max_entries."""
+    now = datetime.utcnow().isoformat()
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO llm_cache (
+                cache_key,
+                call_site,
+                model,
+                temperature,
+                response,
+                created_at,
+                expires_at,
+                last_used_at,
+                hits
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                response=excluded.response,
+                created_at=excluded.created_at,
+                expires_at=excluded.expires_at,
+                last_used_at=excluded.last_used_at
+            """,
+            (
+                payload.get("cache_key"),
+                payload.get("call_site"),
+                payload.get("model"),
+                payload.get("temperature"),
+                payload.get("response"),
+                now,
+                payload.get("expires_at"),
+                now,
+            ),
+        )
+        cursor.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        cursor.execute(
+            """
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_entries,),
+        )
+        conn.commit()
+
+
+def log_llm_call(sqlite_path: str, payload: Dict) -> None:
+    """Persist token usage, latency, and cost for one LLM completion."""
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO llm_calls (
+                created_at,
+                run_id,
+                brand_name,
+                call_site,
+                model,
+                status,
+                prompt_tokens,
+                completion_tokens,
+                latency_ms,
+                cost_usd
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                datetime.utcnow().isoformat(),
+                payload.get("run_id"),
+                payload.get("brand_name"),
+                payload.get("call_site"),
+                payload.get("model"),
+                payload.get("status"),
+                payload.get("prompt_tokens", 0),
+                payload.get("completion_tokens", 0),
+                payload.get("latency_ms", 0),
+                payload.get("cost_usd", 0.0),
+            ),
+        )
+        conn.commit()
+
+
+def summarize_llm_calls(sqlite_path: str, run_id: str) -> list[Dict]:
+    """Return per (brand_name, call_site) totals for a run."""
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT
+                brand_name,
+                call_site,
+                COUNT(*) AS calls,
+                SUM(status != 'ok') AS errors,
+                SUM(prompt_tokens) AS prompt_tokens,
+                SUM(completion_tokens) AS completion_tokens,
+                SUM(latency_ms) AS latency_ms,
+                SUM(cost_usd) AS cost_usd
+            FROM llm_calls
+            WHERE run_id = ?
+            GROUP BY brand_name, call_site
+            ORDER BY brand_name, call_site
+            """,
+            (run_id,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def save_llm_run(sqlite_path: str, payload: Dict) -> None:
+    """Insert or replace the totals row for a run."""
+    with sqlite3.connect(sqlite_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO llm_runs (
+                run_id,
+                started_at,
+                finished_at,
+                scheduled_posts,
+                calls,
+                prompt_tokens,
+                completion_tokens,
+                latency_ms,
+                cost_usd
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                payload.get("run_id"),
+                payload.get("started_at"),
+                payload.get("finished_at"),
+                payload.get("scheduled_posts", 0),
+                payload.get("calls", 0),
+                payload.get("prompt_tokens", 0),
+                payload.get("completion_tokens", 0),
+                payload.get("latency_ms", 0),
+                payload.get("cost_usd", 0.0),
+            ),
+        )
+        conn.commit()
+
+
+def get_recent_llm_runs(sqlite_path: str, limit: int = 7, exclude_run_id: str = "") -> list[Dict]:
+    """Return the most recent llm_runs rows, newest first."""
+    with sqlite3.connect(sqlite_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM llm_runs WHERE run_id != ? ORDER BY started_at DESC LIMIT ?",
+            (exclude_run_id, limit),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
 def log_scheduled_post(sqlite_path: str, payload: Dict) -> None:
     """Insert a scheduled post record into post_log."""
     _ensure_dir(sqlite_path)
@@ -334,7 +767,7 @@ def build_log_payload(entry: Dict, product: Dict, caption: str, status: str, rea
         "timestamp": datetime.utcnow().isoformat(),
         "rss_source": entry.get("source", ""),
         "article_title": entry.get("title", ""),
-        "article_url": entry.get("url", ""),
+        "article_url": entry.get("article_url", ""),
         "product_name": product.get("product_name", ""),
         "product_url": product.get("product_url", ""),
         "product_image_url": product.get("product_image_url", ""),
@@ -0,0 +1,154 @@
+from dataclasses import dataclass, field, fields, replace
+from datetime import datetime
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from utils.config import SETTINGS
+from utils.text_normalizer import fit_token_budget
+
+
+T = TypeVar("T")
+
+
+# Cache structures derived from a catalog (search index, embeddings, prompt digest).
+def catalog_cache(build: Callable[[Sequence[Any]], T]) -> Callable[[Sequence[Any]], T]:
+    """Wrap build(products) so each distinct catalog is built once.
+
+    Results are kept per catalog contents (the 8 most recent), and repeated calls with the same
+    list object skip hashing the catalog. Unhashable plain-dict products are built uncached.
+    """
+    cached_build = lru_cache(maxsize=8)(build)
+    by_list: Dict[int, Tuple[Sequence[Any], int, T]] = {}
+
+    @wraps(build)
+    def wrapper(products: Sequence[Any]) -> T:
+        hit = by_list.get(id(products))
+        if hit is not None and hit[0] is products and hit[1] == len(products):
+            return hit[2]
+        try:
+            value = cached_build(tuple(products))
+        except TypeError:
+            return build(products)
+        if len(by_list) >= 8:
+            by_list.pop(next(iter(by_list)))
+        by_list[id(products)] = (products, len(products), value)
+        return value
+
+    return wrapper
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls: type) -> FrozenSet[str]:
+    """Return the dataclass field names for a record class."""
+    return frozenset(item.name for item in fields(cls))
+
+
+class _Record:
+    """Read-only mapping adapter so record types work at existing dict call sites."""
+
+    __slots__ = ()
+    _aliases: Dict[str, str] = {}
+
+    def _resolve(self, key: str) -> str:
+        return self._aliases.get(key, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a field value by (legacy) key name, like dict.get."""
+        name = self._resolve(key)
+        if name in _field_names(type(self)):
+            return getattr(self, name)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        name = self._resolve(key)
+        if name not in _field_names(type(self)):
+            raise KeyError(key)
+        return getattr(self, name)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._resolve(key) in _field_names(type(self))
+
+    def keys(self) -> Iterator[str]:
+        """Field names, so dict(record) and {**record} keep working."""
+        return iter(item.name for item in fields(self))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a shallow dict copy of the record."""
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def evolve(self, **changes: Any):
+        """Return a copy with the given fields replaced (the record itself is immutable)."""
+        return replace(self, **{self._resolve(key): value for key, value in changes.items()})
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """Build a record from a dict, mapping legacy keys and ignoring unknown ones."""
+        if isinstance(data, cls):
+            return data
+        names = _field_names(cls)
+        values = {}
+        for key, value in data.items():
+            name = cls._aliases.get(key, key)
+            if name in names and name not in values:
+                values[name] = value
+        return cls(**values)
+
+
+@dataclass(frozen=True, slots=True)
+class Entry(_Record):
+    """A normalized RSS article.
+
+    article_url is the publishable link (redirect wrappers unwrapped); canonical_url is the
+    normalized form used only as the dedupe and history key.
+    """
+
+    source: str = ""
+    title: str = ""
+    article_url: str = ""
+    summary: str = ""
+    published: Optional[datetime] = None
+    original_url: str = ""
+    canonical_url: str = ""
+    brand_name: str = ""
+    brand_tags: str = ""
+    body: str = ""
+    # Near-duplicate cluster members; mutable so late arrivals can still be attached.
+    duplicates: List["Entry"] = field(default_factory=list, compare=False, hash=False)
+
+    _aliases = {"url": "article_url", "link": "article_url"}
+
+    def history_key(self) -> str:
+        """URL used to dedupe the entry and look it up in article history."""
+        return self.canonical_url or self.article_url
+
+    def excerpt(self) -> str:
+        """Trimmed article body when one was fetched, otherwise the RSS summary (within ARTICLE_TOKEN_BUDGET)."""
+        text = self.body[:SETTINGS.article_excerpt_chars] if self.body else self.summary
+        return fit_token_budget(text, SETTINGS.article_token_budget)
+
+    def article_text(self) -> str:
+        """Title plus excerpt: the article text used by scoring and prompts."""
+        return f"{self.title} {self.excerpt()}".strip()
+
+
+@dataclass(frozen=True, slots=True)
+class Product(_Record):
+    """A catalog product row plus its resolved image details."""
+
+    product_name: str = ""
+    product_url: str = ""
+    product_image_url: str = ""
+    image_path: str = ""
+    image_status: str = ""
+    image_name: str = ""
+    image_rotation_index: str = ""
+    image_rotation_total: str = ""
+    description: str = ""
+    ingredients: str = ""
+    main_benefit: str = ""
+    category: str = ""
+    sub_category: str = ""
+    tags: str = ""
+    priority: str = ""
+
+    _aliases = {"key_ingredients": "ingredients", "image_url": "product_image_url"}
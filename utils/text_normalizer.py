@@ -0,0 +1,60 @@
+import re
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+
+# Markup that never carries article text; <font> holds Google News source labels.
+STRIP_TAGS = ["script", "style", "noscript", "img", "figure", "iframe", "font"]
+BOILERPLATE_PATTERNS = [
+    re.compile(r"The post .+? appeared first on .+?(\.|$)", re.IGNORECASE),
+    re.compile(r"View Full Coverage on Google News", re.IGNORECASE),
+    re.compile(r"(Continue reading|Read more|Read the full (article|story))\W*$", re.IGNORECASE),
+    re.compile(r"\[(…|\.\.\.)\]|\[&#8230;\]"),
+]
+# Roughly one model token per word or punctuation mark.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def _strip_html(text: str) -> str:
+    """Return the visible text of an HTML fragment, dropping link-only source lists."""
+    soup = BeautifulSoup(text, "html.parser")
+    for tag in soup(STRIP_TAGS):
+        tag.decompose()
+    for listing in soup(["ol", "ul"]):
+        items = listing.find_all("li")
+        if items and all(
+            item.get_text(strip=True) == " ".join(link.get_text(strip=True) for link in item("a"))
+            for item in items
+        ):
+            listing.decompose()
+    return soup.get_text(" ")
+
+
+# Clean an RSS title or summary before it reaches scoring and prompts.
+def normalize_feed_text(text: str, title: str = "") -> str:
+    """Strip HTML, entities, feed boilerplate, and extra whitespace.
+
+    Returns "" when the cleaned text only repeats (a prefix of) ``title``, as Google News
+    summaries do.
+    """
+    if not text:
+        return ""
+    if "<" in text or "&" in text:
+        text = _strip_html(text)
+    for pattern in BOILERPLATE_PATTERNS:
+        text = pattern.sub(" ", text)
+    text = " ".join(text.split())
+    if title and " ".join(title.split()).lower().startswith(text.lower().rstrip(" .")):
+        return ""
+    return text
+
+
+@lru_cache(maxsize=4096)
+def fit_token_budget(text: str, budget: int) -> str:
+    """Truncate text after about ``budget`` tokens (words and punctuation); 0 disables the cap."""
+    if budget <= 0:
+        return text
+    for count, match in enumerate(TOKEN_PATTERN.finditer(text), start=1):
+        if count == budget:
+            return text[:match.end()]
+    return text